@@ -1,10 +1,11 @@
 import sys
 import os
 import random
+import argparse
 from PIL import Image
 
 # Toolbox Functions:
-from toolbox.image_helpers import (choose_yes_no)
+from toolbox.image_helpers import (choose_yes_no, format_image)
 from toolbox.image_basics import (start_crop_process, start_flip_process, start_scale_process, start_padding_process, start_rotate_process)
 from toolbox.color import (start_monochrome_process, start_hue_shift_process, start_resaturate_process, start_pseudo_color_process, start_color_split_process)
 from toolbox.pixel_sorting import (start_line_sort_process, start_glitch_sort_process, start_ghost_split_process)
@@ -14,20 +15,13 @@ from toolbox.filters import (start_convolution_process, start_non_linear_filter_
 from toolbox.warps import (start_wave_warp_process, start_mirror_process)
 from toolbox.blending import (start_blend_line_process, start_pixelate_process)
 from toolbox.overlays import (start_overlay_process)
+from toolbox.recipes import (load_recipe)
+from toolbox.batch import (run_batch)
+from toolbox.streaming import (MEMORY_LIMIT)
 
 # place to save the image
 OUTPUT_PATH = None
  
-# ensure image format can be understood by the program
-def format_image(image):
-	if image.mode not in ['L', 'RGB', 'RGBA']:
-		try:
-			image = image.convert(mode='RGB')
-		except Exception as e:
-			print(e)
-			image = None
-	return image
-
 # true if user accepts the output file will be overwritten
 def get_output_overwrite_permission():
 	_, filename = os.path.split(OUTPUT_PATH)
@@ -115,10 +109,44 @@ def check_page_jump(code): # assume stripped, lower code
 	except Exception as e:
 		return None
 
+# apply a recipe to each input without prompts
+def batch_main(args):
+	parser = argparse.ArgumentParser(prog='image_toolbox.py', description='Apply a recipe of effects to images.',
+									epilog='interactive mode: image_toolbox.py <input.file> [output.file]')
+	parser.add_argument('--recipe', required=True, help='json list of effects and their parameters')
+	parser.add_argument('--output-dir', help='folder for the results (inputs are overwritten without one)')
+	parser.add_argument('--workers', type=int, help='number of processes (default: all cores)')
+	parser.add_argument('--max-in-flight', type=int, help='most images being processed at once (default: 2 per worker)')
+	parser.add_argument('--stream', action='store_true', help='process each image in bands of rows (point and neighbourhood effects only)')
+	parser.add_argument('--memory-limit', type=int, help=f'memory for each streamed image in MB (default: {MEMORY_LIMIT // 2**20}) - implies --stream')
+	parser.add_argument('--seed', type=int, help='seed for the random choices, so runs are repeatable (default: a fresh seed)')
+	parser.add_argument('inputs', nargs='+', help='image files or folders of images')
+	args = parser.parse_args(args)
+	# read recipe
+	try:
+		recipe = load_recipe(args.recipe)
+	except Exception as e:
+		print(e)
+		return 2
+	# process images
+	memory_limit = None
+	if args.memory_limit:
+		memory_limit = args.memory_limit * 2**20
+	elif args.stream:
+		memory_limit = MEMORY_LIMIT
+	failures = run_batch(args.inputs, recipe, args.output_dir, args.workers, args.max_in_flight, memory_limit, args.seed)
+	if failures:
+		return 8
+	return 0
+
 def main():
 	# command line arguments
+	# batch mode - a recipe, or any leading option (like --help)
+	if '--recipe' in sys.argv[1:] or any(arg.startswith('--recipe=') for arg in sys.argv[1:]) or sys.argv[1:2] and sys.argv[1].startswith('-'):
+		return batch_main(sys.argv[1:])
 	if len(sys.argv) < 2:
 		print('usage: image_toolbox.py <input.file> [output.file]')
+		print('       image_toolbox.py --recipe <recipe.json> [--output-dir <folder>] [--stream] [--seed N] <inputs...>')
 		return 1
 
 	# try to open input image
@@ -295,5 +323,6 @@ def main():
 	return 0 # graceful exit
 
 # RUN
-random.seed()
-main()
\ No newline at end of file
+if __name__ == '__main__':
+	random.seed()
+	sys.exit(main())
\ No newline at end of file
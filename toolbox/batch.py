@@ -0,0 +1,147 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import (ProcessPoolExecutor, wait, FIRST_COMPLETED)
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image
+from .image_helpers import (format_image, spawn_seeds)
+from .recipes import (apply_recipe)
+from .streaming import (stream_image)
+from .tiling import (set_tile_workers)
+
+# --- batch processing ---
+# apply a recipe to many images without prompts
+
+IMAGE_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp', '.ppm', '.pgm', '.pnm']
+
+# expand directories into the images they contain (not recursive)
+def find_images(input_paths):
+	image_paths = []
+	for path in input_paths:
+		if os.path.isdir(path):
+			for name in sorted(os.listdir(path)):
+				_, extension = os.path.splitext(name)
+				file_path = os.path.join(path, name)
+				if extension.lower() in IMAGE_EXTENSIONS and os.path.isfile(file_path):
+					image_paths.append(file_path)
+		else:
+			image_paths.append(path)
+	return image_paths
+
+# keep the file name - no output folder overwrites the input
+def get_output_path(input_path, output_dir=None):
+	if not output_dir:
+		return input_path
+	_, filename = os.path.split(input_path)
+	return os.path.join(output_dir, filename)
+
+# memory_limit - stream the image in bands that fit within this many bytes (None loads the whole image)
+# seed - for the random choices of the recipe (None for a fresh one)
+def process_image(input_path, output_path, recipe, memory_limit=None, seed=None):
+	if memory_limit:
+		stream_image(input_path, output_path, recipe, memory_limit, seed)
+		return
+	image = format_image(Image.open(input_path))
+	if not image:
+		raise ValueError('cannot read image format')
+	image = apply_recipe(image, recipe, seed)
+	image.save(output_path)
+
+# never raises - returns (input path, output path, seconds, error message or None)
+def run_image(input_path, output_path, recipe, memory_limit=None, seed=None):
+	start = time.perf_counter()
+	error = None
+	try:
+		process_image(input_path, output_path, recipe, memory_limit, seed)
+	except Exception as e:
+		error = str(e) or type(e).__name__
+	return (input_path, output_path, time.perf_counter() - start, error)
+
+# each worker process takes one core
+def init_worker():
+	set_tile_workers(1)
+
+# tracks finished images and prints their status
+class BatchProgress():
+	def __init__(self, total):
+		self.total = total
+		self.finished = 0
+		self.failed = [] # (input path, error)
+		self.start = time.perf_counter()
+
+	def add(self, result):
+		input_path, output_path, seconds, error = result
+		self.finished += 1
+		count = f'({self.finished}/{self.total})'
+		if error:
+			self.failed.append((input_path, error))
+			print(f'{count} {input_path} failed - {error} ({seconds:.2f}s)')
+		else:
+			print(f'{count} {input_path} -> {output_path} ({seconds:.2f}s)')
+
+	def print_summary(self):
+		elapsed = time.perf_counter() - self.start
+		rate = self.finished / elapsed if elapsed > 0 else 0
+		print()
+		print(f'Processed {self.finished} image(s) in {elapsed:.2f}s ({rate:.2f} images/s)')
+		print(f'{self.finished - len(self.failed)} succeeded, {len(self.failed)} failed')
+		for input_path, error in self.failed:
+			print(f' - {input_path}: {error}')
+
+# returns the number of images that failed
+# workers - number of processes (1 runs in this process)
+# max_in_flight - most images submitted at once, which bounds the memory in use
+# memory_limit - stream each image in bands that fit within this many bytes (None loads whole images)
+# seed - each image gets the child of the seed numbered by its place in the inputs, in any worker (None for a fresh seed)
+def run_batch(input_paths, recipe, output_dir=None, workers=None, max_in_flight=None, memory_limit=None, seed=None):
+	image_paths = find_images(input_paths)
+	if output_dir:
+		os.makedirs(output_dir, exist_ok=True)
+	image_seeds = spawn_seeds(seed, len(image_paths))
+	jobs = deque((path, get_output_path(path, output_dir), image_seed) for path, image_seed in zip(image_paths, image_seeds))
+	if not workers:
+		workers = os.cpu_count() or 1
+	workers = max(min(workers, len(jobs)), 1)
+	if not max_in_flight:
+		max_in_flight = 2 * workers
+	progress = BatchProgress(len(jobs))
+	if workers == 1:
+		for input_path, output_path, image_seed in jobs:
+			progress.add(run_image(input_path, output_path, recipe, memory_limit, image_seed))
+	else:
+		while jobs:
+			suspects = run_pool(jobs, recipe, workers, max_in_flight, progress, memory_limit)
+			# a worker died - retry each image it may have been running on its own, to find the culprit
+			for job in suspects:
+				progress.add(run_isolated(job, recipe, memory_limit))
+	progress.print_summary()
+	return len(progress.failed)
+
+# submit jobs until they run out - returns the jobs that were in flight if the pool breaks
+def run_pool(jobs, recipe, workers, max_in_flight, progress, memory_limit=None):
+	in_flight = {} # future -> job
+	with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+		while jobs or in_flight:
+			# top up
+			while jobs and len(in_flight) < max_in_flight:
+				job = jobs.popleft()
+				input_path, output_path, image_seed = job
+				in_flight[pool.submit(run_image, input_path, output_path, recipe, memory_limit, image_seed)] = job
+			done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+			for future in done:
+				job = in_flight.pop(future)
+				try:
+					progress.add(future.result())
+				except BrokenProcessPool:
+					return [job] + list(in_flight.values())
+	return []
+
+# run one job in its own process - a crash only fails this image
+def run_isolated(job, recipe, memory_limit=None):
+	input_path, output_path, image_seed = job
+	start = time.perf_counter()
+	with ProcessPoolExecutor(max_workers=1, initializer=init_worker) as pool:
+		try:
+			return pool.submit(run_image, input_path, output_path, recipe, memory_limit, image_seed).result()
+		except BrokenProcessPool:
+			return (input_path, output_path, time.perf_counter() - start, 'worker process crashed')
@@ -1,6 +1,8 @@
 import random
-from .image_helpers import (print_image_size, choose_option, get_value, get_pixel_rows, get_pixel_columns, get_pixel_array,
-			    			divide_list, place_segments, place_pixels, get_channels, round_pixel, normalize_pixel, denormalize_pixel)
+import numpy as np
+from .image_helpers import (print_image_size, choose_option, get_value, get_pixel_buffer,
+			    			divide_list, get_channels, round_pixel, normalize_pixel, denormalize_pixel)
+from .image_basics import (get_summed_area_table, get_box_sums)
 
 class BlendMode:
 	NORMAL = 0
@@ -18,10 +20,10 @@ class BlendMode:
 	NEGATION = 12
 
 # --- blend modes ---
-def choose_blend_mode():
+def choose_blend_mode(default=0):
 	choices = ['Normal', 'Average', 'Multiply', 'Color Burn', 'Linear Burn', 'Screen', 
 	    		'Color Dodge', 'Linear Dodge', 'Subtract', 'Divide', 'Darken', 'Lighten', 'Negation']
-	return choose_option(choices, 'Blend Mode:')
+	return choose_option(choices, 'Blend Mode:', default)
 
 def get_opacity():
 	print('Enter 0 for a random opacity.')
@@ -164,6 +166,59 @@ def negation_blend(pixel_list, channels=3):
 	blend_math = lambda top, bottom: 1 - abs(1 - top - bottom)
 	return base_blend(pixel_list, channels, blend_math)
 
+# --- array blends ---
+# blend math of each mode on arrays of normalized intensities [0,1] - same operations as the scalar blends
+ARRAY_BLEND_FUNCTIONS = {
+	BlendMode.MULTIPLY: lambda top, bottom: top * bottom,
+	BlendMode.COLOR_BURN: lambda top, bottom: np.where(top != 0, 1 - ((1-bottom) / np.where(top != 0, top, 1)), 0),
+	BlendMode.LINEAR_BURN: lambda top, bottom: top + bottom - 1,
+	BlendMode.SCREEN: lambda top, bottom: 1 - ((1-top) * (1-bottom)),
+	BlendMode.COLOR_DODGE: lambda top, bottom: np.where(top != 1, bottom / np.where(top != 1, 1-top, 1), 1),
+	BlendMode.LINEAR_DODGE: lambda top, bottom: top + bottom,
+	BlendMode.SUBTRACT: lambda top, bottom: bottom - top,
+	BlendMode.DIVIDE: lambda top, bottom: np.where(top != 0, bottom / np.where(top != 0, top, 1), 1),
+	BlendMode.DARKEN: lambda top, bottom: np.minimum(top, bottom),
+	BlendMode.LIGHTEN: lambda top, bottom: np.maximum(top, bottom),
+	BlendMode.NEGATION: lambda top, bottom: 1 - np.abs(1 - top - bottom)
+}
+
+# blend whole layers at once - layers is a list of same-shaped arrays (or an (N, height, width, channels) array)
+# first layer is considered the 'bottom' layer
+# same results as get_blend on the pixels at each position:
+# truncate - pixels (tuples) are cut to whole intensities after opacity
+#            single intensities keep the fractional opacity mix (truncate=False)
+def blend_arrays(layers, blend_mode=BlendMode.AVERAGE, opacity=1, truncate=True):
+	bottom = layers[0]
+	if len(layers) == 1:
+		return bottom
+	# Normal
+	if blend_mode == BlendMode.NORMAL: # last layer overwrites all
+		blend = layers[-1]
+	# Average
+	elif blend_mode == BlendMode.AVERAGE:
+		total = bottom.astype(np.float64)
+		for i in range(1, len(layers)):
+			total = total + layers[i]
+		blend = np.clip(np.round(total / len(layers)), 0, 255)
+	# mix each layer into the layers below it
+	elif blend_mode in ARRAY_BLEND_FUNCTIONS:
+		blend_function = ARRAY_BLEND_FUNCTIONS[blend_mode]
+		mix = bottom / 255
+		# stacked divides / dodges / burns can overflow - infinite intensities are full, undefined ones empty
+		with np.errstate(over='ignore', divide='ignore', invalid='ignore'):
+			for i in range(1, len(layers)):
+				mix = blend_function(layers[i] / 255, mix)
+		mix = np.nan_to_num(mix, nan=0, posinf=1, neginf=0)
+		blend = np.clip(np.round(mix * 255), 0, 255)
+	# Undefined
+	else:
+		raise ValueError(f'Undefined blend mode - {blend_mode}')
+	# apply opacity
+	blend = (blend * opacity) + (bottom * (1-opacity))
+	if truncate:
+		blend = np.trunc(blend)
+	return blend
+
 # --- blend lines ---
 def start_blend_line_process(image):
 	blend_rows = True
@@ -181,27 +236,34 @@ def start_blend_line_process(image):
 	return image
 
 def blend_lines(image, rows=True, num_lines=2, bm=BlendMode.AVERAGE, alpha=1):
-	if rows:
-		lines = get_pixel_rows(image)
-	else: # cols
-		lines = get_pixel_columns(image)
-	total_lines = len(lines)
-	line_width = len(lines[0])
+	buffer = get_pixel_buffer(image)
+	lines = buffer.get_lines(rows) # views into the buffer
+	total_lines = lines.shape[0]
 	num_groups = total_lines / num_lines # how many groups of n lines
-	line_groups = divide_list(lines, num_groups)
-	# blend - original lines are affected directly by the groups
-	for next_group in line_groups:
-		n = len(next_group) # number of lines in this group
-		for i in range(line_width):
-			# pixels from all lines in the group at the same col/row
-			aligned_pixels = [next_group[x][i] for x in range(n)]
-			blend = get_blend(aligned_pixels, blend_mode=bm, opacity=alpha) # averaged pixel
-			for x in range(n): # apply to sampled area
-				next_group[x][i] = blend
+	line_groups = divide_list(range(total_lines), num_groups) # line numbers of each group
+	# blend - every group in a run of equally sized groups at once
+	for start, group_size, group_count in get_group_runs(line_groups):
+		end = start + group_size * group_count
+		groups = lines[start:end].reshape((group_count, group_size) + lines.shape[1:])
+		# each line of a group is a layer
+		blend = blend_arrays(groups.swapaxes(0, 1), blend_mode=bm, opacity=alpha)
+		# apply to every line in the group
+		lines[start:end] = np.broadcast_to(blend[:, np.newaxis], groups.shape).reshape(lines[start:end].shape)
 	# reconstruct image
-	place_segments(image, lines, horizontal=rows)
+	buffer.write_to(image)
 	return image
 
+# (start, group size, number of groups) of each run of consecutive groups with the same size
+def get_group_runs(groups):
+	runs = []
+	for group in groups:
+		if runs and len(group) == runs[-1][1] and group.start == runs[-1][0] + runs[-1][1] * runs[-1][2]:
+			start, group_size, group_count = runs[-1]
+			runs[-1] = (start, group_size, group_count + 1)
+		elif len(group) > 0:
+			runs.append((group.start, len(group), 1))
+	return runs
+
 def choose_rows_cols():
 	choices = ['Rows', 'Columns']
 	return choose_option(choices, 'Line Type')
@@ -218,8 +280,10 @@ def get_lines(image, rows=True):
 def start_pixelate_process(image):
 	box_size = get_pixelate_size(image)
 	print()
+	mode = choose_blend_mode(default=BlendMode.AVERAGE)
+	print()
 	print('Pixelating...')
-	image = pixelate(image, box_size)
+	image = pixelate(image, box_size, mode)
 	return image
 
 def get_pixelate_size(image):
@@ -227,25 +291,58 @@ def get_pixelate_size(image):
 	max_box = int(min_dim * 0.2)
 	return get_value(1, max_box, 'Pixel Size', integer=True)
 
-def pixelate(image, box_size):
-	width, height = image.size
-	image_array = get_pixel_array(image, True)
-	for x in range(0, width, box_size):
-		for y in range(0, height, box_size):
-			# get a list of all pixels within the box
-			pixel_list = []
-			for box_x in range(x, x+box_size):
-				for box_y in range(y, y+box_size):
-					if box_x < width and box_y < height: # within bounds
-						index = (width * box_y) + box_x
-						pixel_list.append(image_array[index])
-			# blend box area
-			blend = get_blend(pixel_list, blend_mode=BlendMode.AVERAGE)
-			# redistribute pixel list to the image array
-			for box_x in range(x, x+box_size):
-				for box_y in range(y, y+box_size):
-					if box_x < width and box_y < height: # within bounds
-						index = (width * box_y) + box_x
-						image_array[index] = blend
-	place_pixels(image, image_array, True)
-	return image
\ No newline at end of file
+def pixelate(image, box_size, bm=BlendMode.AVERAGE):
+	buffer = get_pixel_buffer(image)
+	height, width = buffer.array.shape[:2]
+	if bm == BlendMode.AVERAGE:
+		blocks = average_blocks(buffer.array, box_size)
+	else:
+		blocks = blend_blocks(buffer.array, box_size, bm)
+	# upsample - every pixel of a box takes its blend
+	blocks = np.repeat(np.repeat(blocks, box_size, axis=0)[:height], box_size, axis=1)[:, :width]
+	buffer.array[:] = blocks
+	buffer.write_to(image)
+	return image
+
+# average of every box - (box rows, box cols, channels)
+# full boxes are summed with a reshape, and the ragged boxes along the bottom and right edges from a summed-area table
+def average_blocks(array, box_size):
+	height, width, channels = array.shape
+	full_rows, full_cols = (height // box_size, width // box_size)
+	# bounds of every box (inclusive)
+	tops = np.arange(0, height, box_size)
+	bottoms = np.minimum(tops + box_size, height) - 1
+	lefts = np.arange(0, width, box_size)
+	rights = np.minimum(lefts + box_size, width) - 1
+	sums = np.zeros((len(tops), len(lefts), channels), dtype=np.int64)
+	# full boxes
+	full = array[:full_rows*box_size, :full_cols*box_size].reshape(full_rows, box_size, full_cols, box_size, channels)
+	sums[:full_rows, :full_cols] = full.sum(axis=(1, 3), dtype=np.int64)
+	# ragged edges
+	if full_rows < len(tops) or full_cols < len(lefts):
+		table = get_summed_area_table(array)
+		sums[full_rows:] = get_box_sums(table, tops[full_rows:], bottoms[full_rows:], lefts, rights)
+		sums[:full_rows, full_cols:] = get_box_sums(table, tops[:full_rows], bottoms[:full_rows], lefts[full_cols:], rights[full_cols:])
+	counts = (bottoms - tops + 1)[:, np.newaxis] * (rights - lefts + 1)[np.newaxis, :]
+	return np.clip(np.round(sums / counts[:, :, np.newaxis]), 0, 255)
+
+# blend of every box - (box rows, box cols, channels)
+# the full boxes, bottom edge, right edge and corner each have one box size, and are blended as layers
+def blend_blocks(array, box_size, blend_mode):
+	height, width, channels = array.shape
+	full_height, full_width = (height - height % box_size, width - width % box_size)
+	blocks = np.zeros((-(-height // box_size), -(-width // box_size), channels))
+	full_rows, full_cols = (full_height // box_size, full_width // box_size)
+	for rows, box_rows in [((0, full_height), slice(0, full_rows)), ((full_height, height), slice(full_rows, None))]:
+		for cols, box_cols in [((0, full_width), slice(0, full_cols)), ((full_width, width), slice(full_cols, None))]:
+			region = array[rows[0]:rows[1], cols[0]:cols[1]]
+			if region.size == 0:
+				continue
+			box_height = min(box_size, rows[1] - rows[0])
+			box_width = min(box_size, cols[1] - cols[0])
+			num_rows, num_cols = (region.shape[0] // box_height, region.shape[1] // box_width)
+			# one layer per pixel of a box - column by column, same order as the pixels of a box were listed
+			boxes = region.reshape(num_rows, box_height, num_cols, box_width, channels)
+			layers = boxes.transpose(3, 1, 0, 2, 4).reshape(box_width * box_height, num_rows, num_cols, channels)
+			blocks[box_rows, box_cols] = blend_arrays(layers, blend_mode=blend_mode)
+	return blocks
@@ -1,9 +1,12 @@
 import math
 import random
+import functools
+import numpy as np
 from PIL import Image
-from .image_helpers import (choose_option, get_value, get_brightness, clamp_intensity, round_pixel, to_radians)
-from .image_basics import (PaddingType, pad_image, crop_image)
-from .blending import (BlendMode, choose_blend_mode, get_blend, get_opacity)
+from .image_helpers import (PixelBuffer, PaddingType, choose_option, get_value, get_brightness, get_brightness_array, round_pixel, to_radians,
+							get_generator, spawn_generators)
+from .blending import (BlendMode, choose_blend_mode, get_blend, get_opacity, blend_arrays)
+from .tiling import (map_tiles)
 
 # Color Presets
 BLACK = (0,0,0)
@@ -21,38 +24,45 @@ def start_monochrome_process(image):
 	print()
 	if color_key == BLACK:
 		print('Converting to Grayscale...')
-		image = image_to_grayscale(image)
 	else:
 		print('Converting to Monochrome...')
-		image = image_to_monochrome(image, color_key)
-	return image
+	return apply_monochrome(image, color_key)
+
+# black converts to grayscale
+def apply_monochrome(image, color):
+	if color == BLACK:
+		return image_to_grayscale(image)
+	return image_to_monochrome(image, color)
 
 def to_grayscale(pixel): # make pixel gray
 	return get_brightness(pixel)
 
 def image_to_grayscale(image):
-	width, height = image.size
-	gray_image = Image.new(mode='L', size=(width,height))
-	for x in range(width):
-		for y in range(height):
-			source = image.getpixel((x,y))
-			gray_image.putpixel((x,y), to_grayscale(source))
-	return gray_image
+	buffer = PixelBuffer.from_image(image)
+	buffer.array = grayscale_array(buffer.array)
+	return buffer.to_image()
+
+# (height, width, 1) brightness of each pixel
+def grayscale_array(array):
+	return get_brightness_array(array)[:, :, np.newaxis]
 
 def image_to_monochrome(image, color):
-	width, height = image.size
-	image_mode = image.mode
-	if image_mode not in ['RGB', 'RGBA']:
-		image_mode = 'RGB'
-	mono_image = Image.new(mode=image_mode, size=(width,height))
+	if image.mode not in ['L', 'RGB', 'RGBA']:
+		image = image.convert(mode='RGB')
+	buffer = PixelBuffer.from_image(image)
+	buffer.array = monochrome_array(buffer.array, color)
+	return buffer.to_image()
+
+# grayscale arrays become rgb
+def monochrome_array(array, color):
+	if array.shape[2] == 1:
+		array = np.repeat(array, 3, axis=2)
+	else:
+		array = array.copy()
 	hue = rgb_to_hsv(color)[0] # make monochromatic in this color
-	for x in range(width):
-		for y in range(height):
-			source = image.getpixel((x,y))
-			source_hsv = rgb_to_hsv(source)
-			new_pixel = hsv_to_rgb((hue, source_hsv[1], source_hsv[2]))
-			mono_image.putpixel((x,y), new_pixel)
-	return mono_image
+	_, saturation, value = rgb_to_hsv_array(array)
+	array[:, :, :3] = hsv_to_rgb_array(hue, saturation, value)
+	return array
 
 def choose_monochrome_color():
 	choices = ['Grayscale', 'Redscale', 'Greenscale', 'Bluescale', 'Custom Color']
@@ -83,16 +93,16 @@ def get_hue_shift():
 	return get_value(-360, 360, 'Hue Shift', default=30) % 360
 
 def hue_shift(image, degrees):
-	width, height = image.size
-	new_image = Image.new(mode=image.mode, size=(width,height))
-	for x in range(width):
-		for y in range(height):
-			source = image.getpixel((x,y))
-			source_hsv = rgb_to_hsv(source)
-			new_hue = (source_hsv[0] + degrees) % 360
-			new_pixel = hsv_to_rgb((new_hue, source_hsv[1], source_hsv[2]))
-			new_image.putpixel((x,y), new_pixel)
-	return new_image
+	buffer = PixelBuffer.from_image(image)
+	buffer.array = hue_shift_array(buffer.array, degrees)
+	return buffer.to_image()
+
+def hue_shift_array(array, degrees):
+	array = array.copy()
+	hue, saturation, value = rgb_to_hsv_array(array)
+	new_hue = (hue + degrees) % 360
+	array[:, :, :3] = hsv_to_rgb_array(new_hue, saturation, value)
+	return array
 
 # --- resaturate ---
 def start_resaturate_process(image):
@@ -120,26 +130,21 @@ def get_saturation_scale(by_percent=False):
 		return get_value(-100, 100, 'Saturation Constant (%)', default=10) / 100
 	
 def resaturate(image, scale, by_percent=False):
-	width, height = image.size
-	new_image = Image.new(mode=image.mode, size=(width,height))
-	for x in range(width):
-		for y in range(height):
-			source = image.getpixel((x,y))
-			source_hsv = rgb_to_hsv(source)
-			if not by_percent:
-				new_sat = source_hsv[1] + scale
-			else: # multiply by percentage
-				new_sat = source_hsv[1] * scale
-			# bounds
-			if new_sat > 1:
-				new_sat = 1
-			elif new_sat < 0:
-				new_sat = 0
-			new_pixel = list(source_hsv)
-			new_pixel[1] = new_sat
-			new_pixel = hsv_to_rgb(new_pixel)
-			new_image.putpixel((x,y), new_pixel)
-	return new_image
+	buffer = PixelBuffer.from_image(image)
+	buffer.array = resaturate_array(buffer.array, scale, by_percent)
+	return buffer.to_image()
+
+def resaturate_array(array, scale, by_percent=False):
+	array = array.copy()
+	hue, saturation, value = rgb_to_hsv_array(array)
+	if not by_percent:
+		new_sat = saturation + scale
+	else: # multiply by percentage
+		new_sat = saturation * scale
+	# bounds
+	new_sat = np.clip(new_sat, 0, 1)
+	array[:, :, :3] = hsv_to_rgb_array(hue, new_sat, value)
+	return array
 
 # --- color split ---
 def start_color_split_process(image):
@@ -160,11 +165,11 @@ def start_color_split_process(image):
 	alpha = get_opacity()
 	print()
 	print('Splitting Colors...')
-	# first pad image
-	image = pad_image(image, split_radius, padding_type=PaddingType.REFLECTED)
-	image = color_split(image, split_radius, split_dir, split_colors, blend_type=blend, blend_alpha=alpha)
-	image = crop_image(image, split_radius)
-	return image
+	return apply_color_split(image, split_radius, split_dir, split_colors, blend, alpha)
+
+# split with reflected edges
+def apply_color_split(image, radius, split_directions, colors, blend_type=BlendMode.AVERAGE, blend_alpha=1):
+	return color_split(image, radius, split_directions, colors, blend_type, blend_alpha, boundary=PaddingType.REFLECTED)
 
 def get_split_shape():
 	choices = ['Upright-Y', 'Upright-T', 'X-Shape', 'Custom']
@@ -185,10 +190,17 @@ def create_split_directions():
 	num_splits = get_value(1, 5, 'Number of Splits', integer=True)
 	print()
 	print('Enter angle of each split...\n')
-	split_directions = []
+	split_angles = []
 	for i in range(num_splits):
 		degrees = get_value(-360, 360, f'Split {i+1} (degrees)', default=0)
 		print()
+		split_angles.append(degrees)
+	return make_split_directions(split_angles)
+
+# unit vectors at each angle (degrees ccw)
+def make_split_directions(split_angles):
+	split_directions = []
+	for degrees in split_angles:
 		rad = to_radians(degrees)
 		shift_x = math.cos(rad)
 		shift_y = math.sin(rad)
@@ -196,16 +208,20 @@ def create_split_directions():
 	return split_directions
 
 def get_split_directions(shape):
+	print('Rotate Split Shape:')
+	print(f'- Default is the upright {shape} shape')
+	x = get_value(-360, 360, f'Rotate {shape} CCW (degrees)', default=0)
+	return make_shape_directions(shape, x)
+
+# directions of a Y, T or X shape rotated ccw
+def make_shape_directions(shape, degrees=0):
 	if shape == 'Y': # Y-shape
 		split_directions = [(-1,1), (1,1), (0,-1)]
 	elif shape == 'T': # T-shape
 		split_directions = [(-1,0), (1,0), (0,-1)]
 	else: # X-shape
 		split_directions = [(-1,1), (1,1), (-1,-1), (1,-1)]
-	print('Rotate Split Shape:')
-	print(f'- Default is the upright {shape} shape')
-	x = get_value(-360, 360, f'Rotate {shape} CCW (degrees)', default=0)
-	rotation = to_radians(x)
+	rotation = to_radians(degrees)
 	for i in range(3):
 		try:
 			rad = math.atan(split_directions[i][1] / split_directions[i][0])
@@ -227,24 +243,72 @@ def get_split_radius(image):
 		x = random.randint(1,100)
 		print(f'{x} (random)')
 		x /= 100
+	return get_radius_pixels(image, x)
+
+# radius as a percent of the largest radius that fits the image
+def get_radius_pixels(image, p_radius):
 	max_radius = min(image.width, image.height) / 2
-	return int(x * max_radius)
+	return int(p_radius * max_radius)
 
 def get_split_colors(splits):
 	print('Which Colors to Split?')
 	print('======================')
-	colors = []
+	hues = []
 	default = 0 # red
 	for i in range(splits):
 		instructions = False
 		if i == 0:
 			instructions = True
 		hue = get_hue(show_ranges=instructions, default_hue=default)
-		colors.append(hsv_to_rgb((hue,1,1)))
+		hues.append(hue)
 		default += int(360 / splits)
-	return colors
-
-def color_split(image, radius, split_directions, colors, blend_type=BlendMode.AVERAGE, blend_alpha=1):
+	return make_split_colors(hues)
+
+# fully saturated colors of each hue
+def make_split_colors(hues):
+	return [hsv_to_rgb((hue,1,1)) for hue in hues]
+
+# boundary - how pixels past the image edge are read (PaddingType) - None skips the splits from outside the image
+def color_split(image, radius, split_directions, colors, blend_type=BlendMode.AVERAGE, blend_alpha=1, boundary=None):
+	buffer = PixelBuffer.from_image(image)
+	# tiles run in parallel - each reads as far as the splits reach
+	split_tile = lambda tile: color_split_array(tile, radius, split_directions, colors, blend_type, blend_alpha)
+	buffer.array = map_tiles(buffer.array, split_tile, get_split_halo(radius, split_directions), boundary)
+	return buffer.to_image()
+
+# (x, y) offset of the pixel that each split moves onto a location
+def get_split_shifts(radius, split_directions):
+	return [(int(dx * radius), int(dy * radius)) for dx, dy in split_directions]
+
+# (top, bottom, left, right) reach of the splits
+def get_split_halo(radius, split_directions):
+	shifts = get_split_shifts(radius, split_directions)
+	shifts_x = [shift_x for shift_x, _ in shifts]
+	shifts_y = [shift_y for _, shift_y in shifts]
+	return (max(max(shifts_y), 0), max(-min(shifts_y), 0), max(max(shifts_x), 0), max(-min(shifts_x), 0))
+
+# color split a (height, width, channels) array - splits from outside the array are skipped
+def color_split_array(array, radius, split_directions, colors, blend_type=BlendMode.AVERAGE, blend_alpha=1):
+	height, width = array.shape[:2]
+	output = array.astype(np.float64)
+	# receive colors from the pixels that split to each location
+	for i, (shift_x, shift_y) in enumerate(get_split_shifts(radius, split_directions)):
+		# locations whose source exists
+		top, bottom = (max(0, shift_y), min(height, height + shift_y))
+		left, right = (max(0, shift_x), min(width, width + shift_x))
+		if top >= bottom or left >= right:
+			continue
+		pixels = output[top:bottom, left:right]
+		color_source = array[top-shift_y:bottom-shift_y, left-shift_x:right-shift_x]
+		for k in range(3): # channels
+			p = colors[i][k] / 255 # percent of rgb channel that this color (colors[i]) uses
+			absorbed_color = (pixels[:, :, k] * (1-p) + color_source[:, :, k] * p)
+			pixels[:, :, k] = blend_arrays([pixels[:, :, k], absorbed_color], blend_type, blend_alpha, truncate=False)
+	# round off
+	return np.clip(np.round(output), 0, 255).astype(np.uint8)
+
+# original pixel by pixel split
+def reference_color_split(image, radius, split_directions, colors, blend_type=BlendMode.AVERAGE, blend_alpha=1):
 	width, height = image.size
 	splits = len(split_directions)
 	new_image = Image.new(mode=image.mode, size=(width,height))
@@ -285,40 +349,41 @@ def choose_pseudo_color():
 	return choose_option(choices, 'Pseudo Algorithm:')
 
 def apply_heatmap(image):
-	width, height = image.size
-	colored_image = Image.new(mode='RGB', size=(width,height))
-	for x in range(width):
-		for y in range(height):
-			gray_pixel = to_grayscale(image.getpixel((x,y)))
-			# assign color
-			red = gray_pixel # highest at white
-			green = clamp_intensity(255 - 2 * abs(gray_pixel - 127)) # highest at mid-gray
-			blue = 255 - gray_pixel # highest at black
-			# place colored pixel
-			color_pixel = (red,green,blue)
-			colored_image.putpixel((x,y), color_pixel)
-	return colored_image
+	buffer = PixelBuffer.from_image(image)
+	buffer.array = heatmap_array(buffer.array)
+	return buffer.to_image()
+
+# rgb heatmap of the brightness of each pixel
+def heatmap_array(array):
+	gray_pixels = get_brightness_array(array).astype(np.int64)
+	# assign color
+	red = gray_pixels # highest at white
+	green = np.clip(255 - 2 * np.abs(gray_pixels - 127), 0, 255) # highest at mid-gray
+	blue = 255 - gray_pixels # highest at black
+	return np.stack([red, green, blue], axis=-1).astype(np.uint8)
 
 def get_number_of_colors():
 	return get_value(2, 20, 'Max Colors', integer=True, default=4)
 
-def apply_random_colors(image, num_colors):
-	width, height = image.size
-	# choose colors
+# seed - for the colors (see spawn_seeds)
+def apply_random_colors(image, num_colors, seed=None):
+	buffer = PixelBuffer.from_image(image)
+	buffer.array = random_colors_array(buffer.array, get_random_colors(num_colors, seed))
+	return buffer.to_image()
+
+# each color has its own stream of the seed
+def get_random_colors(num_colors, seed=None):
 	color_list = []
-	for _ in range(num_colors):
-		color_list.append(get_random_color())
-	interval_width = 256 / num_colors
-	colored_image = Image.new(mode='RGB', size=(width,height))
-	# fill color
-	for x in range(width):
-		for y in range(height):
-			gray_pixel = to_grayscale(image.getpixel((x,y)))
-			# choose color
-			i = int(gray_pixel / interval_width)
-			color_pixel = color_list[i]
-			colored_image.putpixel((x,y), color_pixel)
-	return colored_image
+	for rng in spawn_generators(seed, num_colors):
+		color_list.append(get_random_color(rng))
+	return color_list
+
+# color each pixel by the interval of intensities its brightness falls in
+def random_colors_array(array, color_list):
+	interval_width = 256 / len(color_list)
+	gray_pixels = get_brightness_array(array)
+	color_index = (gray_pixels / interval_width).astype(np.int64) # round down
+	return np.array(color_list, dtype=np.uint8)[color_index]
 
 # --- Color Input ---
 def get_hue(show_ranges=True, default_hue=0):
@@ -344,10 +409,12 @@ def create_color(): # in rgb
 	return hsv_to_rgb(h,s,v)
 
 # --- Color Functions ---
-def get_random_color():
+def get_random_color(rng=None):
+	if rng is None:
+		rng = get_generator()
 	c = [0,0,0]
 	for i in range(3):
-		c[i] = random.randint(0,255)
+		c[i] = int(rng.integers(0, 256))
 	return tuple(c)
 
 def rgb_to_hsv(rgb):
@@ -407,6 +474,62 @@ def hsv_to_rgb(hsv):
 	r, g, b = (round((r_n+m)*255), round((g_n+m)*255), round((b_n+m)*255))
 	return (r,g,b)
 
+# --- Array Color Functions ---
+# same results as rgb_to_hsv for every pixel of a (..., 3+) array - returns (hue, saturation, value) planes
+def rgb_to_hsv_array(rgb):
+	rgb = rgb[..., :3]
+	# normalize: 0..255 -> [0,1]
+	r_n, g_n, b_n = (rgb[..., 0] / 255, rgb[..., 1] / 255, rgb[..., 2] / 255)
+	# max/min
+	c_max = np.maximum(np.maximum(r_n, g_n), b_n)
+	c_min = np.minimum(np.minimum(r_n, g_n), b_n)
+	delta = c_max - c_min
+	safe_delta = np.where(delta == 0, 1, delta)
+	# hue (degrees) - first matching case, like the branches of rgb_to_hsv
+	h = np.select(
+		[delta == 0, c_max == r_n, c_max == g_n],
+		[0, 60 * ((g_n - b_n)/safe_delta % 6), 60 * ((b_n - r_n)/safe_delta + 2)],
+		60 * ((r_n - g_n)/safe_delta + 4))
+	h = np.round(h).astype(np.int64) # integer
+	# saturation and value depend only on the max/min intensity - look up their rounded values
+	max_intensity = rgb.max(axis=-1)
+	min_intensity = rgb.min(axis=-1)
+	s = get_saturation_table()[max_intensity, min_intensity]
+	v = get_value_table()[max_intensity]
+	return (h, s, v)
+
+# same results as hsv_to_rgb for arrays (or scalars) of hue, saturation, value - returns a (..., 3) uint8 array
+def hsv_to_rgb_array(h, s, v):
+	h = np.mod(h, 360) # 0..359
+	# convert to RGB
+	c = v * s
+	x = c * (1 - np.abs(h/60 % 2 - 1))
+	m = v - c
+	zero = np.zeros(np.shape(c))
+	# based on hue
+	sectors = [h < 60, h < 120, h < 180, h < 240, h < 300, h < 360]
+	r_n = np.select(sectors, [c, x, zero, zero, x, c], 0)
+	g_n = np.select(sectors, [x, c, c, x, zero, zero], 0)
+	b_n = np.select(sectors, [zero, zero, x, c, c, x], 0)
+	# normalize to RGB space 0..255
+	rgb = np.stack([(r_n+m)*255, (g_n+m)*255, (b_n+m)*255], axis=-1)
+	return np.round(rgb).astype(np.uint8)
+
+# saturation of every (max, min) intensity pair, rounded as in rgb_to_hsv
+@functools.lru_cache(maxsize=None)
+def get_saturation_table():
+	table = np.zeros((256, 256))
+	for c_max in range(1, 256):
+		for c_min in range(c_max + 1):
+			delta = c_max/255 - c_min/255
+			table[c_max, c_min] = round(delta/(c_max/255), 2)
+	return table
+
+# value of every max intensity, rounded as in rgb_to_hsv
+@functools.lru_cache(maxsize=None)
+def get_value_table():
+	return np.array([round(c_max/255, 2) for c_max in range(256)])
+
 # adds to the hue, saturation or value or a color (in rgb)
 def change_color(color, d_h=0, d_s=0, d_v=0):
 	h, s, v = rgb_to_hsv(color)
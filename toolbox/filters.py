@@ -1,6 +1,8 @@
+import numpy as np
 from PIL import Image
-from .image_helpers import (print_image_size, choose_option, get_value, get_channels, clamp_intensity)
-from .image_basics import (PaddingType, pad_image, crop_image)
+from .image_helpers import (PixelBuffer, PaddingType, print_image_size, choose_option, get_value, get_channels, clamp_intensity)
+from .image_basics import (pad_image, crop_image)
+from .tiling import (map_tiles)
 
 # --- convolutions ---
 def start_convolution_process(image):
@@ -11,17 +13,11 @@ def start_convolution_process(image):
 	kernel_matrix = get_kernel_matrix(kernel_size)
 	print()
 	print('Performing Convolution...')
-	# first pad the image
-	pad_w, pad_h = kernel_size
-	pad_w //= 2
-	pad_h //= 2
-	pad_dims = (pad_h, pad_h, pad_w, pad_w)
-	image = pad_image(image, pad_dims, PaddingType.REFLECTED)
-	# next apply the matrixs
-	image = convolve(image, kernel_matrix, kernel_scale)
-	# cut off padding
-	image = crop_image(image, pad_dims)
-	return image
+	return apply_convolution(image, kernel_matrix, kernel_scale)
+
+# convolve with reflected edges
+def apply_convolution(image, kernel_matrix, kernel_scale=1):
+	return convolve(image, kernel_matrix, kernel_scale, boundary=PaddingType.REFLECTED)
 
 def get_kernel_size(image): # (width, height)
 	print_image_size(image)
@@ -68,8 +64,157 @@ def get_kernel_matrix(size):
 			break
 	return convolution_matrix
 
+class ConvolutionMethod():
+	AUTO = 0 # separable when possible, otherwise direct - fft for large dyadic kernels (same rounding as direct)
+	DIRECT = 1
+	SEPARABLE = 2
+	REFERENCE = 3 # pixel by pixel loop
+	FFT = 4 # approximate - exact .5 ties may round either way unless the weights are dyadic
+
+# largest kernels still run by the direct (area) and separable (width + height) methods - fft beyond
+FFT_CROSSOVER_AREA = 25
+FFT_CROSSOVER_SEPARABLE = 16
+
 # kernel is matrix: [[row],[row],...,[row]]
-def convolve(image, kernel, scale=1):
+# boundary - how pixels past the image edge are read (PaddingType)
+def convolve(image, kernel, scale=1, method=ConvolutionMethod.AUTO, boundary=PaddingType.ZERO):
+	kernel_size = (len(kernel[0]), len(kernel))
+	if boundary == PaddingType.ZERO: # pixels past the edge already count as 0
+		boundary = None
+	if method == ConvolutionMethod.REFERENCE:
+		return pad_reference_filter(image, lambda padded: reference_convolve(padded, kernel, scale), kernel_size, boundary)
+	buffer = PixelBuffer.from_image(image)
+	# tiles run in parallel - each reads the reach of the kernel around it
+	# explicit fft sums depend on the transform size, so they run over the whole image (same result for any workers)
+	convolve_tile = lambda tile: convolve_array(tile, kernel, scale, method)
+	tile_size = None
+	if method == ConvolutionMethod.FFT:
+		tile_size = (None, None)
+	buffer.array = map_tiles(buffer.array, convolve_tile, get_kernel_halo(kernel_size), boundary, tile_size)
+	return buffer.to_image()
+
+# run a pixel by pixel filter on the image padded by the kernel halo, then crop the padding back off
+def pad_reference_filter(image, reference_function, kernel_size, boundary=None):
+	if boundary == None:
+		return reference_function(image)
+	pad_dims = get_kernel_halo(kernel_size)
+	image = pad_image(image, pad_dims, boundary)
+	return crop_image(reference_function(image), pad_dims)
+
+# (top, bottom, left, right) reach of a kernel centered on a pixel (shifted right/down if even)
+def get_kernel_halo(kernel_size):
+	kernel_width, kernel_height = kernel_size
+	return (kernel_height//2, kernel_height - 1 - kernel_height//2, kernel_width//2, kernel_width - 1 - kernel_width//2)
+
+# convolve a (height, width, channels) array - pixels outside the array count as 0
+def convolve_array(array, kernel, scale=1, method=ConvolutionMethod.AUTO):
+	kernel = np.array(kernel, dtype=np.float64)
+	source = array.astype(np.float64)
+	factors = None
+	if method in [ConvolutionMethod.AUTO, ConvolutionMethod.SEPARABLE]:
+		factors = get_separable_factors(kernel)
+	if method == ConvolutionMethod.AUTO:
+		method = choose_convolution_method(kernel, factors)
+	if method == ConvolutionMethod.FFT:
+		output = fft_correlate(source, kernel)
+	elif method == ConvolutionMethod.SEPARABLE and factors: # two 1-D passes
+		column, row = factors
+		output = correlate(source, column[:, np.newaxis])
+		output = correlate(output, row[np.newaxis, :])
+	else: # full 2-D kernel
+		output = correlate(source, kernel)
+	# scale by matrix coefficient, then round + handle out of bound intensities
+	output *= scale
+	return np.clip(np.round(output), 0, 255).astype(np.uint8)
+
+# (column, row) vectors whose outer product is exactly the kernel - None if the kernel is not rank one
+def get_separable_factors(kernel):
+	# every row must be a multiple of the row holding the largest weight
+	y, x = np.unravel_index(np.argmax(np.abs(kernel)), kernel.shape)
+	if kernel[y, x] == 0: # empty kernel
+		return None
+	row = kernel[y]
+	column = kernel[:, x] / kernel[y, x]
+	if not np.array_equal(np.outer(column, row), kernel):
+		return None
+	return (column, row)
+
+def choose_convolution_method(kernel, factors=None):
+	kernel_height, kernel_width = kernel.shape
+	# the two passes only sum exactly like the direct method (same rounding of .5 ties) for dyadic factors
+	if factors and not all(get_dyadic_grid(factor) for factor in factors):
+		factors = None
+	if factors:
+		if kernel_width + kernel_height <= FFT_CROSSOVER_SEPARABLE:
+			return ConvolutionMethod.SEPARABLE
+	elif kernel_width * kernel_height <= FFT_CROSSOVER_AREA:
+		return ConvolutionMethod.DIRECT
+	# fft sums can only be snapped back to the exact sums for dyadic weights
+	if get_dyadic_grid(kernel):
+		return ConvolutionMethod.FFT
+	return ConvolutionMethod.DIRECT
+
+# weighted sum of the neighbourhood of each pixel (matrix centered on the pixel, shifted right/down if even)
+def correlate(source, kernel):
+	height, width = source.shape[:2]
+	kernel_height, kernel_width = kernel.shape
+	output = np.zeros(source.shape, dtype=np.float64)
+	for y in range(kernel_height):
+		dy = y - kernel_height//2
+		# output rows whose source row exists
+		top, bottom = (max(0, -dy), min(height, height - dy))
+		if top >= bottom:
+			continue
+		for x in range(kernel_width):
+			dx = x - kernel_width//2
+			left, right = (max(0, -dx), min(width, width - dx))
+			if left >= right or kernel[y, x] == 0:
+				continue
+			output[top:bottom, left:right] += source[top+dy:bottom+dy, left+dx:right+dx] * kernel[y, x]
+	return output
+
+# same result as correlate(), using one batched transform for all color channels
+def fft_correlate(source, kernel):
+	height, width = source.shape[:2]
+	kernel_height, kernel_width = kernel.shape
+	# zero-padded to the full linear convolution - no wrap around
+	shape = (get_fast_length(height + kernel_height - 1), get_fast_length(width + kernel_width - 1))
+	spectrum = np.fft.rfft2(source, s=shape, axes=(0, 1))
+	spectrum *= np.fft.rfft2(kernel[::-1, ::-1], s=shape)[:, :, np.newaxis] # flipped kernel
+	output = np.fft.irfft2(spectrum, s=shape, axes=(0, 1))
+	# crop to the kernel center
+	top = kernel_height - 1 - kernel_height//2
+	left = kernel_width - 1 - kernel_width//2
+	output = output[top:top+height, left:left+width]
+	# dyadic weights (n / 2^d) on integer pixels give sums on a grid of 1 / 2^d - remove the transform's rounding noise
+	# so exact ties (.5) round the same way as the direct sums
+	grid = get_dyadic_grid(kernel)
+	if grid:
+		snapped = np.round(output * grid) / grid
+		output = np.where(np.abs(snapped - output) < 1e-6, snapped, output)
+	return output
+
+# smallest power of 2 (up to 2^16) that makes every weight an integer - None if there is none
+def get_dyadic_grid(kernel):
+	for d in range(17):
+		scaled = kernel * 2**d
+		if np.array_equal(scaled, np.round(scaled)):
+			return 2**d
+	return None
+
+# smallest length >= n with no prime factors above 5 (fast transform sizes)
+def get_fast_length(n):
+	while True:
+		m = n
+		for p in [2, 3, 5]:
+			while m % p == 0:
+				m //= p
+		if m == 1:
+			return n
+		n += 1
+
+# original pixel by pixel convolution
+def reference_convolve(image, kernel, scale=1):
 	width, height = image.size
 	channels = get_channels(image.getpixel((0,0))) # number of color channels of source image
 	# create convolved image
@@ -137,7 +282,152 @@ def choose_non_linear_filter():
 	choices = ['Min', 'Max', 'Median']
 	return choose_option(choices, 'Filter:')
 
-def non_linear_filter(image, filter_size, filter_type=0):
+# boundary - how pixels past the image edge are read (PaddingType) - None ignores them
+def non_linear_filter(image, filter_size, filter_type=0, boundary=None):
+	buffer = PixelBuffer.from_image(image)
+	filter_tile = lambda tile: non_linear_filter_array(tile, filter_size, filter_type)
+	buffer.array = map_tiles(buffer.array, filter_tile, get_kernel_halo(filter_size), boundary)
+	return buffer.to_image()
+
+# filter a (height, width, channels) array - pixels outside the array are ignored
+def non_linear_filter_array(array, filter_size, filter_type=0):
+	if filter_type == 2:
+		return median_filter_array(array, filter_size)
+	return min_max_filter_array(array, filter_size, maximum=(filter_type == 1))
+
+# separable min/max - running extrema across rows, then down columns
+# pixels outside the array are ignored
+def min_max_filter_array(array, filter_size, maximum=False):
+	filter_width, filter_height = filter_size
+	function = np.maximum if maximum else np.minimum
+	array = running_extremum(array, filter_width, 1, function)
+	return running_extremum(array, filter_height, 0, function)
+
+# min/max of the window around each value along an axis (van Herk/Gil-Werman)
+# 3 comparisons per value for any window size
+def running_extremum(array, size, axis, function):
+	identity = 0 if function is np.maximum else 255 # never chosen over a real value
+	array = np.moveaxis(array, axis, 0)
+	length = array.shape[0]
+	# window of value i covers padded[i : i+size] - centered, shifted right/down if even
+	blocks = -(-(length + size - 1) // size)
+	padded = np.full((blocks * size,) + array.shape[1:], identity, dtype=array.dtype)
+	padded[size//2 : size//2 + length] = array
+	grouped = padded.reshape((blocks, size) + array.shape[1:])
+	# extremum from the start of each block / to the end of each block
+	prefix = function.accumulate(grouped, axis=1).reshape(padded.shape)
+	suffix = function.accumulate(grouped[:, ::-1], axis=1)[:, ::-1].reshape(padded.shape)
+	# a window spans at most two blocks
+	output = function(suffix[:length], prefix[size-1 : size-1 + length])
+	return np.moveaxis(output, 0, axis)
+
+# largest windows whose values are stacked and sorted - sliding histograms beyond
+STACKED_MEDIAN_AREA = 121
+STACKED_MEDIAN_BYTES = 32 * 2**20 # stacked values sorted at once
+
+# pixels outside the array are ignored (even count - average middle values)
+def median_filter_array(array, filter_size):
+	filter_width, filter_height = filter_size
+	if filter_width * filter_height <= STACKED_MEDIAN_AREA:
+		return stacked_median_filter_array(array, filter_size)
+	return histogram_median_filter_array(array, filter_size)
+
+# sort the values of each window - in bands of rows so the stacked values stay small
+def stacked_median_filter_array(array, filter_size):
+	height, width, channels = array.shape
+	filter_width, filter_height = filter_size
+	area = filter_width * filter_height
+	# pixels outside the array are 256 - sorted after every real value
+	padded = np.full((height + filter_height - 1, width + filter_width - 1, channels), 256, dtype=np.uint16)
+	padded[filter_height//2:filter_height//2 + height, filter_width//2:filter_width//2 + width] = array
+	# values in each window
+	rows = np.minimum(np.arange(height) - filter_height//2 + filter_height, height) - np.maximum(np.arange(height) - filter_height//2, 0)
+	columns = np.minimum(np.arange(width) - filter_width//2 + filter_width, width) - np.maximum(np.arange(width) - filter_width//2, 0)
+	counts = rows[:, np.newaxis, np.newaxis] * columns[np.newaxis, :, np.newaxis]
+	output = np.empty(array.shape, dtype=np.uint8)
+	band_height = max(STACKED_MEDIAN_BYTES // (width * channels * area * 2), 1)
+	for top in range(0, height, band_height):
+		bottom = min(top + band_height, height)
+		stack = np.empty((bottom - top, width, channels, area), dtype=np.uint16)
+		for y in range(filter_height):
+			for x in range(filter_width):
+				stack[..., y * filter_width + x] = padded[top + y:bottom + y, x:x + width]
+		stack.sort(axis=3)
+		n = np.broadcast_to(counts[top:bottom], stack.shape[:3])[..., np.newaxis]
+		lower = np.take_along_axis(stack, (n-1)//2, axis=3)[..., 0]
+		upper = np.take_along_axis(stack, n//2, axis=3)[..., 0]
+		output[top:bottom] = np.round((lower + upper.astype(np.float64)) / 2)
+	return output
+
+# sliding histogram median (8-bit)
+# column histograms hold the rows of the current window and are summed across each window with prefix sums
+# a coarse histogram (16 bins of 16 values) finds the bin of the median, then the fine histogram finds the value
+# fine prefix sums are only brought up to date for the coarse bins holding a median (like Perreault-Hebert) - large windows change their median slowly
+def histogram_median_filter_array(array, filter_size):
+	height, width, channels = array.shape
+	filter_width, filter_height = filter_size
+	fine_histograms = np.zeros((channels, 256, width), dtype=np.int32)
+	coarse_histograms = np.zeros((channels, 16, width), dtype=np.int32)
+	channel_index = np.arange(channels)[:, np.newaxis]
+	columns = np.arange(width)[np.newaxis, :]
+	# columns covered by the window of each output pixel
+	left = np.clip(np.arange(width) - filter_width//2, 0, width)
+	right = np.clip(np.arange(width) - filter_width//2 + filter_width, 0, width)
+	fine_prefix = np.zeros((channels, 256, width + 1), dtype=np.int32)
+	coarse_prefix = np.zeros((channels, 16, width + 1), dtype=np.int32)
+	# add/remove a row of the image from the column histograms
+	def update_histograms(row, amount):
+		values = array[row].T # (channels, width)
+		fine_histograms[channel_index, values, columns] += amount
+		coarse_histograms[channel_index, values >> 4, columns] += amount
+	output = np.empty(array.shape, dtype=np.uint8)
+	top = bottom = 0 # rows held by the column histograms
+	for y in range(height):
+		# slide the window down
+		new_top = max(0, y - filter_height//2)
+		new_bottom = min(height, y - filter_height//2 + filter_height)
+		for row in range(top, new_top):
+			update_histograms(row, -1)
+		for row in range(bottom, new_bottom):
+			update_histograms(row, 1)
+		top, bottom = (new_top, new_bottom)
+		# prefix sums across the row - a window histogram is the difference of two prefixes
+		np.cumsum(coarse_histograms, axis=2, out=coarse_prefix[:, :, 1:])
+		coarse_windows = coarse_prefix[:, :, right] - coarse_prefix[:, :, left]
+		np.cumsum(coarse_windows, axis=1, out=coarse_windows)
+		# even length - average middle values
+		n = (right - left) * (bottom - top)
+		ranks = ((n-1)//2, n//2)
+		# coarse bins holding the ranks
+		coarse_bins = [np.count_nonzero(coarse_windows <= rank, axis=1) for rank in ranks]
+		needed_bins = np.zeros((channels, 16), dtype=bool)
+		for coarse_bin in coarse_bins:
+			needed_bins[channel_index, coarse_bin] = True
+		for c, b in zip(*np.nonzero(needed_bins)):
+			np.cumsum(fine_histograms[c, b*16:b*16 + 16], axis=1, out=fine_prefix[c, b*16:b*16 + 16, 1:])
+		lower = select_rank(fine_prefix, coarse_windows, coarse_bins[0], left, right, ranks[0])
+		upper = select_rank(fine_prefix, coarse_windows, coarse_bins[1], left, right, ranks[1])
+		output[y] = np.round((lower + upper) / 2).T
+	return output
+
+# value with the given rank (0 = smallest) in each window - (channels, width)
+# coarse_bin - coarse bin holding the rank
+def select_rank(fine_prefix, coarse_cumulative, coarse_bin, left, right, rank):
+	channels = fine_prefix.shape[0]
+	# how many values come before the coarse bin
+	below = np.take_along_axis(coarse_cumulative, np.maximum(coarse_bin - 1, 0)[:, np.newaxis], axis=1)[:, 0]
+	below[coarse_bin == 0] = 0
+	# fine histogram of the 16 values in that bin - flat indices of the prefix sums at the right edge of each window
+	row_length = fine_prefix.shape[2]
+	fine_bins = (np.arange(channels)[:, np.newaxis] * 256 + coarse_bin * 16)[:, np.newaxis, :] + np.arange(16)[np.newaxis, :, np.newaxis]
+	indices = fine_bins * row_length + right
+	fine_prefix = fine_prefix.reshape(-1)
+	fine_windows = fine_prefix.take(indices) - fine_prefix.take(indices - (right - left))
+	fine_cumulative = np.cumsum(fine_windows, axis=1)
+	return coarse_bin * 16 + np.count_nonzero(fine_cumulative <= (rank - below)[:, np.newaxis, :], axis=1)
+
+# original pixel by pixel filter
+def reference_non_linear_filter(image, filter_size, filter_type=0):
 	width, height = image.size
 	channels = get_channels(image.getpixel((0,0))) # number of color channels of source image
 	# create filtered image
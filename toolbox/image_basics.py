@@ -1,6 +1,9 @@
 import math
+import functools
+import numpy as np
 from PIL import Image
-from .image_helpers import (get_dimensions, get_dimension_offsets, choose_option, choose_yes_no, get_value, get_channels, read_offsets, to_radians, list_all_null)
+from .image_helpers import (PixelBuffer, PaddingType, boundary_indices, get_boundary_pixels, get_blank_pixel, get_dimensions, get_dimension_offsets, choose_option, choose_yes_no, get_value, get_channels, read_offsets, to_radians, list_all_null)
+from .tiling import (run_tiles)
 BLACK = (0,0,0)
 
 # --- Basic Toolbox Functions ---
@@ -73,8 +76,10 @@ def start_rotate_process(image):
 	print()
 	padding_type = choose_padding_type()
 	print()
+	interpolation = choose_interpolation()
+	print()
 	print('Rotating...')
-	image = pad_rotate(image, degrees, padding_type)
+	image = pad_rotate(image, degrees, padding_type, interpolation)
 	return image
 
 def get_rotation(): # degrees
@@ -114,7 +119,90 @@ def rotate_image(image, degrees):
 
 # instead of running through all the source pixels, rotating them, and placing them in the corresponding location in the destination image,
 # run through all the destination pixels, undo the rotation, then select the corresponding pixel from the source image to copy
-def complete_rotate_image(image, degrees):
+def complete_rotate_image(image, degrees, interpolation=0):
+	return pad_rotate(image, degrees, PaddingType.ZERO, interpolation)
+
+# pixels rotated in from past the edge are read through the padding type (zero-padding leaves them black)
+def pad_rotate(image, degrees, padding_type=0, interpolation=0):
+	buffer = PixelBuffer.from_image(image)
+	buffer.array = rotate_array(buffer.array, degrees, padding_type, interpolation)
+	return buffer.to_image()
+
+# rotate a (height, width, channels) array degrees ccw about (width/2, height/2) - same sampling as reference_rotate_image
+def rotate_array(array, degrees, padding_type=PaddingType.ZERO, interpolation=0):
+	height, width = array.shape[:2]
+	degrees %= 360
+	# quarter turns that land on whole pixels only move pixels
+	if degrees % 90 == 0 and (degrees % 180 == 0 or (width + height) % 2 == 0):
+		return quarter_turn_array(array, int(degrees // 90), padding_type)
+	# PIL uses a left-handed coordinate system, so angle is reversed (clockwise) by default
+	rotation = to_radians(degrees)
+	matrix = ((math.cos(rotation), -math.sin(rotation)), (math.sin(rotation), math.cos(rotation)))
+	return remap_affine(array, matrix, padding_type, interpolation)
+
+# rotate by 0, 90, 180 or 270 degrees - each source row / column is a destination column / row
+def quarter_turn_array(array, turns, padding_type=PaddingType.ZERO):
+	height, width = array.shape[:2]
+	x = np.arange(width)
+	y = np.arange(height)
+	if turns == 0:
+		return array.copy()
+	elif turns == 2:
+		return get_boundary_pixels(array, height - y, width - x, padding_type)
+	# destination column x reads source row, destination row y reads source column
+	if turns == 1:
+		rows = x + (height - width) // 2
+		columns = (width + height) // 2 - y
+	else:
+		rows = (width + height) // 2 - x
+		columns = y + (width - height) // 2
+	return get_boundary_pixels(array, rows, columns, padding_type).transpose(1, 0, 2)
+
+# --- affine remapping ---
+# every destination pixel reads the source location it came from, so the result has no gaps
+# matrix - 2x2 inverse transformation about (width/2, height/2): source offset = matrix @ destination offset
+# interpolation - 0 nearest neighbour, 1 bilinear
+def remap_affine(array, matrix, padding_type=PaddingType.ZERO, interpolation=0):
+	remap_tile = lambda top, bottom, left, right: remap_affine_tile(array, matrix, (top, bottom, left, right), padding_type, interpolation)
+	return run_tiles(array.shape, remap_tile)
+
+# destination pixels within (top, bottom, left, right)
+def remap_affine_tile(array, matrix, bounds, padding_type=PaddingType.ZERO, interpolation=0):
+	height, width = array.shape[:2]
+	top, bottom, left, right = bounds
+	translation = (width/2, height/2) # to bring center of image to origin
+	(a, b), (c, d) = matrix
+	# center destination pixels at origin, apply the inverse transformation, then undo the translation
+	x = (np.arange(left, right) - translation[0])[np.newaxis, :]
+	y = (np.arange(top, bottom) - translation[1])[:, np.newaxis]
+	source_x = x*a + y*b + translation[0]
+	source_y = x*c + y*d + translation[1]
+	if interpolation == 1: # bilinear - weigh the 4 surrounding pixels
+		left_x = np.floor(source_x)
+		top_y = np.floor(source_y)
+		right_val = (source_x - left_x)[:, :, np.newaxis]
+		bottom_val = (source_y - top_y)[:, :, np.newaxis]
+		left_x = left_x.astype(np.int64)
+		top_y = top_y.astype(np.int64)
+		sample = lambda dy, dx: sample_pixels(array, top_y + dy, left_x + dx, padding_type)
+		top_interpolant = (1 - right_val)*sample(0, 0) + right_val*sample(0, 1)
+		bottom_interpolant = (1 - right_val)*sample(1, 0) + right_val*sample(1, 1)
+		output = (1 - bottom_val)*top_interpolant + bottom_val*bottom_interpolant
+		return np.clip(np.round(output), 0, 255).astype(np.uint8)
+	# round to nearest pixel
+	return sample_pixels(array, np.round(source_y).astype(np.int64), np.round(source_x).astype(np.int64), padding_type)
+
+# pixel at each (row, column) index pair - indices past the edge are read through the padding type
+def sample_pixels(array, rows, columns, padding_type=PaddingType.ZERO):
+	height, width = array.shape[:2]
+	rows = boundary_indices(rows, height, padding_type)
+	columns = boundary_indices(columns, width, padding_type)
+	pixels = array[np.maximum(rows, 0), np.maximum(columns, 0)]
+	pixels[(rows < 0) | (columns < 0)] = 0
+	return pixels
+
+# original pixel by pixel rotation
+def reference_rotate_image(image, degrees):
 	width, height = image.size
 	# PIL uses a left-handed coordinate system, so angle is reversed (clockwise) by default
 	rotation = to_radians(degrees % 360)
@@ -141,29 +229,6 @@ def complete_rotate_image(image, degrees):
 					rotated_image.putpixel((i,k), image.getpixel((source_x,source_y)))
 	return rotated_image
 
-def pad_rotate(image, degrees, padding_type=0):
-	if padding_type == PaddingType.ZERO: # zero-padding
-		return complete_rotate_image(image, degrees)
-	# save original dimensions
-	width, height = image.size
-	# how much do we need to pad the width and height to prevent areas from being unmapped to
-	max_diameter = math.sqrt(width **2 + height **2)
-	max_diameter = math.ceil(max_diameter)
-	width_padding = (max_diameter - width) / 2
-	width_padding = math.ceil(width_padding)
-	height_padding = (max_diameter - height) / 2
-	height_padding = math.ceil(height_padding)
-	# set padding dimensions
-	pad_dims = [height_padding] * 2
-	pad_dims.extend([width_padding] * 2)
-	# pad the image
-	image = pad_image(image, pad_dims, padding_type)
-	# now rotate the image
-	image = complete_rotate_image(image, degrees)
-	# now crop down to the original dimensions
-	image = crop_image(image, pad_dims) # undo the padding
-	return image
-
 # --- scale ---
 def start_scale_process(image):
 	new_dim = get_dimensions(image)
@@ -185,6 +250,92 @@ def choose_interpolation(downsampling=False):
 	return choose_option(choices, 'Interpolation Type:')
 
 def scale_image(image, new_size, interpolation=0):
+	buffer = PixelBuffer.from_image(image)
+	new_width, new_height = new_size
+	# bands of the scaled image are sampled in parallel
+	scale_tile = lambda top, bottom, left, right: scale_array(buffer.array, new_size, interpolation, (top, bottom, left, right))
+	buffer.array = run_tiles((new_height, new_width, buffer.channels), scale_tile)
+	return buffer.to_image()
+
+# scale a (height, width, channels) array - same sampling as the pixel functions below
+# bounds - (top, bottom, left, right) part of the scaled array to compute (all of it by default)
+def scale_array(array, new_size, interpolation=0, bounds=None):
+	height, width = array.shape[:2]
+	new_width, new_height = new_size
+	top, bottom, left, right = bounds or (0, new_height, 0, new_width)
+	# where each destination column and row samples the source
+	samples_x = [sample[left:right] for sample in get_axis_samples(width, new_width, interpolation)]
+	samples_y = [sample[top:bottom] for sample in get_axis_samples(height, new_height, interpolation)]
+	if interpolation == 2: # box sampling
+		box_left, box_right = samples_x
+		box_top, box_bottom = samples_y
+		# sum each box from a summed-area table of the rows the boxes cover
+		first_row = box_top.min()
+		table = get_summed_area_table(array[first_row:box_bottom.max() + 1])
+		sample = get_box_sums(table, box_top - first_row, box_bottom - first_row, box_left, box_right)
+		total_pixels = (box_bottom - box_top + 1)[:, np.newaxis] * (box_right - box_left + 1)[np.newaxis, :]
+		return np.clip(np.round(sample / total_pixels[:, :, np.newaxis]), 0, 255).astype(np.uint8)
+	elif interpolation == 1: # bilinear
+		left_x, right_x, left_val = samples_x
+		top_y, bottom_y, top_val = samples_y
+		# interpolate the left and right pixels along each source row that is read
+		rows, row_index = np.unique(np.concatenate([top_y, bottom_y]), return_inverse=True)
+		left_val = left_val[np.newaxis, :, np.newaxis] # percent of left pixel to use
+		source_rows = array[rows]
+		row_interpolants = left_val*source_rows[:, left_x] + (1 - left_val)*source_rows[:, right_x]
+		top_interpolant = row_interpolants[row_index[:len(top_y)]]
+		bottom_interpolant = row_interpolants[row_index[len(top_y):]]
+		# then interpolate between the top and bottom rows
+		top_val = top_val[:, np.newaxis, np.newaxis]
+		return np.clip(np.round(top_val*top_interpolant + (1 - top_val)*bottom_interpolant), 0, 255).astype(np.uint8)
+	else: # nearest neighbour
+		nearest_x, = samples_x
+		nearest_y, = samples_y
+		return array[nearest_y][:, nearest_x]
+
+# where each destination index along an axis samples the source - computed once for each (length, new length, interpolation)
+# nearest neighbour 	-> (nearest index,)
+# bilinear 				-> (low index, high index, weight of the low index)
+# box sampling 			-> (first index, last index) of each box
+@functools.lru_cache(maxsize=64)
+def get_axis_samples(length, new_length, interpolation=0):
+	scale = new_length/length
+	positions = np.arange(new_length) / scale # original location of each destination index
+	if interpolation == 2:
+		samples = get_box_bounds(positions, math.ceil(1/scale), length)
+	elif interpolation == 1:
+		low = np.minimum(positions.astype(np.int64), length-1)
+		high = np.minimum(np.ceil(positions).astype(np.int64), length-1)
+		samples = (low, high, high - positions)
+	else:
+		samples = (np.minimum(np.round(positions).astype(np.int64), length-1),)
+	for sample in samples: # shared by every call
+		sample.flags.writeable = False
+	return samples
+
+# first and last source index of the box around each location, within the image
+def get_box_bounds(positions, box_size, length):
+	box_start = np.maximum(np.trunc(positions - box_size/2).astype(np.int64), 0)
+	box_end = np.minimum(np.ceil(positions + box_size/2).astype(np.int64), length-1)
+	return (box_start, box_end)
+
+# table[y, x] is the sum of the (height, width, channels) array above and left of (x, y)
+def get_summed_area_table(array):
+	height, width, channels = array.shape
+	table = np.zeros((height + 1, width + 1, channels), dtype=np.int64)
+	table[1:, 1:] = np.cumsum(np.cumsum(array, axis=0, dtype=np.int64), axis=1)
+	return table
+
+# sum of every box spanning rows [box_top, box_bottom] and columns [box_left, box_right] - 4 lookups per box
+def get_box_sums(table, box_top, box_bottom, box_left, box_right):
+	top = box_top[:, np.newaxis]
+	bottom = box_bottom[:, np.newaxis] + 1
+	left = box_left[np.newaxis, :]
+	right = box_right[np.newaxis, :] + 1
+	return table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]
+
+# original pixel by pixel scaling
+def reference_scale_image(image, new_size, interpolation=0):
 	width, height = image.size
 	new_width, new_height = new_size
 	scale_x = new_width/width
@@ -297,11 +448,6 @@ def start_padding_process(image):
 		image = pad_image(image, pad_dimensions, padding_type)
 	return image
 
-class PaddingType():
-	ZERO = 0
-	CIRCULAR = 1
-	REFLECTED = 2
-
 def choose_padding_type():
 	choices = ['Zero-Padding', 'Circular-Indexing', 'Reflected-Indexing']
 	return choose_option(choices, 'Padding Type:')
@@ -311,39 +457,10 @@ def get_pad_width(cur_image): # top, bottom, left, right
 
 def pad_image(source_image, pad_dims, padding_type=PaddingType.ZERO):
 	pad_dims = read_offsets(pad_dims)
-	width, height = source_image.size
-	# new image bounds
-	new_width = width + pad_dims[2] + pad_dims[3]
-	new_height = height + pad_dims[0] + pad_dims[1]
-	padded_image = Image.new(mode=source_image.mode, size=(new_width,new_height))
-	color_black = BLACK
-	if source_image.mode == 'L':
-		color_black = 0
-	# fill new image based on padding type
-	for x in range(new_width):
-		for y in range(new_height):
-			# get pixel data
-			pixel = color_black # default
-			relative_x = x - pad_dims[2]
-			relative_y = y - pad_dims[0]
-			# circular
-			if padding_type == PaddingType.CIRCULAR:
-				pixel = source_image.getpixel((relative_x % width, relative_y % height))
-			# reflected
-			elif padding_type == PaddingType.REFLECTED:
-				u = relative_x
-				v = relative_y
-				if (relative_x // width) % 2 == 1: # reflected x
-					u = (width - 1) - relative_x
-				if (relative_y // height) % 2  == 1: # reflected y
-					v = (height - 1) - relative_y
-				pixel = source_image.getpixel((u % width, v % height))
-			# zero-padding
-			else:
-				# in bounds of original - use same pixel
-				if relative_x >= 0 and relative_x < width:
-					if relative_y >= 0 and relative_y < height:
-						pixel = source_image.getpixel((relative_x, relative_y))
-			# place pixel
-			padded_image.putpixel((x,y), pixel)
-	return padded_image
\ No newline at end of file
+	buffer = PixelBuffer.from_image(source_image)
+	# source of each row / column of the padded image
+	rows = np.arange(-pad_dims[0], buffer.height + pad_dims[1])
+	columns = np.arange(-pad_dims[2], buffer.width + pad_dims[3])
+	# zero-padding fills with (opaque) black
+	buffer.array = get_boundary_pixels(buffer.array, rows, columns, padding_type, get_blank_pixel(buffer.channels))
+	return buffer.to_image()
\ No newline at end of file
@@ -1,5 +1,7 @@
 import os
 import math
+import numpy as np
+from PIL import Image
 
 # alignemnt in 1 dimension
 class Alignment():
@@ -8,6 +10,12 @@ class Alignment():
 	END = 2 # right / bottom
 	CENTER = 3
 
+# how pixels past the edge of an image are filled in
+class PaddingType():
+	ZERO = 0
+	CIRCULAR = 1
+	REFLECTED = 2
+
 # --- Print Functions ---
 def print_image_size(image):
 	width, height = image.size
@@ -184,21 +192,220 @@ def get_image_file(prompt='Enter Image File:'):
 		else:
 			print('could not access image - enter 0 to cancel or try again\n')
 
+# ensure image format can be understood by the program
+def format_image(image):
+	if image.mode not in ['L', 'RGB', 'RGBA']:
+		try:
+			image = image.convert(mode='RGB')
+		except Exception as e:
+			print(e)
+			image = None
+	return image
+
+# --- Pixel Buffer ---
+# numpy copy of an image's pixels - (height, width, channels) uint8 array
+# pixels move between PIL and the buffer in a single bulk copy
+class PixelBuffer():
+	def __init__(self, array, mode):
+		self.array = array
+		self.mode = mode
+
+	@classmethod
+	def from_image(cls, image):
+		array = np.array(image, dtype=np.uint8)
+		if array.ndim == 2: # single channel
+			array = array[:, :, np.newaxis]
+		return cls(array, image.mode)
+
+	@property
+	def width(self):
+		return self.array.shape[1]
+
+	@property
+	def height(self):
+		return self.array.shape[0]
+
+	@property
+	def channels(self):
+		return self.array.shape[2]
+
+	@property
+	def size(self):
+		return (self.width, self.height)
+
+	def copy(self):
+		return PixelBuffer(self.array.copy(), self.mode)
+
+	def to_image(self):
+		array = np.ascontiguousarray(self.array)
+		if self.channels == 1:
+			array = array[:, :, 0]
+		return Image.fromarray(array)
+
+	# overwrite the pixels of an image (same size and mode) with the buffer
+	def write_to(self, image):
+		image.paste(self.to_image())
+
+	# zero-copy line views - changes to a line are changes to the buffer
+	def get_rows(self): # (height, width, channels)
+		return self.array
+
+	def get_columns(self): # (width, height, channels) - transposed view
+		return self.array.transpose(1, 0, 2)
+
+	def get_lines(self, horizontal=True):
+		if horizontal:
+			return self.get_rows()
+		return self.get_columns()
+
+	# linear list of all pixels - row by row / col by col
+	def get_pixels(self, horizontal=True):
+		array = self.array
+		if not horizontal:
+			array = array.transpose(1, 0, 2)
+		return to_pixel_list(array.reshape(-1, self.channels))
+
+	# place pixels in horizontal (or vertical) reading order, after the given index
+	def place_pixels(self, pixel_list, horizontal=True, index=-1):
+		if len(pixel_list) == 0:
+			return index
+		values = pixels_to_array(pixel_list, self.channels)
+		start = index + 1
+		stop = start + len(values)
+		if stop > self.width * self.height:
+			raise IndexError('image index out of range')
+		positions = np.arange(start, stop)
+		if horizontal:
+			rows, cols = (positions // self.width, positions % self.width)
+		else: # vertical
+			rows, cols = (positions % self.height, positions // self.height)
+		self.array[rows, cols] = values
+		return stop - 1
+
+# --- random streams ---
+# randomized effects draw from numpy generators made from a seed (None for a fresh one)
+# a seed is split into child streams by counting - one for each line, section or pass
+# so the results do not depend on the order (or the process) that each part is made in
+
+def to_seed_sequence(seed=None):
+	if isinstance(seed, np.random.SeedSequence):
+		return seed
+	return np.random.SeedSequence(seed)
+
+# child of a seed numbered by key - the same child every time (unlike SeedSequence.spawn)
+def get_child_seed(seed, key):
+	seed = to_seed_sequence(seed)
+	return np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key + (key,), pool_size=seed.pool_size)
+
+# children [0, count) of a seed
+def spawn_seeds(seed, count):
+	seed = to_seed_sequence(seed)
+	return [get_child_seed(seed, i) for i in range(count)]
+
+# counter-based generator
+def get_generator(seed=None):
+	return np.random.Generator(np.random.Philox(to_seed_sequence(seed)))
+
+def spawn_generators(seed, count):
+	return [get_generator(child) for child in spawn_seeds(seed, count)]
+
+# --- boundaries ---
+# pixels past the edge of an array are read by remapping their indices, without building a padded copy
+
+# source index of each (possibly out of range) index along an axis of the given length - same indexing as pad_image
+# zero-padding marks indices outside the axis with -1
+def boundary_indices(indices, length, padding_type=PaddingType.ZERO):
+	indices = np.asarray(indices, dtype=np.int64)
+	if padding_type == PaddingType.CIRCULAR:
+		return indices % length
+	elif padding_type == PaddingType.REFLECTED:
+		reflected = (indices // length) % 2 == 1
+		return np.where(reflected, (length - 1) - indices, indices) % length
+	return np.where((indices >= 0) & (indices < length), indices, -1)
+
+# pixels of a (height, width, channels) array at the given source rows and columns - index -1 is a fill pixel (zero by default)
+def gather_pixels(array, rows, columns, fill=0):
+	pixels = array[np.maximum(rows, 0)][:, np.maximum(columns, 0)]
+	if rows.min() < 0 or columns.min() < 0:
+		pixels[rows < 0] = fill
+		pixels[:, columns < 0] = fill
+	return pixels
+
+# pixels at the given (possibly out of range) rows and columns
+def get_boundary_pixels(array, rows, columns, padding_type=PaddingType.ZERO, fill=0):
+	height, width = array.shape[:2]
+	return gather_pixels(array, boundary_indices(rows, height, padding_type), boundary_indices(columns, width, padding_type), fill)
+
+# rows [top, bottom) and columns [left, right) of the array with the halo around them, read past the edge like get_boundary_pixels
+# a view of the array when the halo lies within it - otherwise only the strips past the edge are gathered
+def get_padded_region(array, bounds, halo, padding_type=PaddingType.ZERO, fill=0):
+	height, width, channels = array.shape
+	top, bottom, left, right = bounds
+	halo_top, halo_bottom, halo_left, halo_right = halo
+	rows = np.arange(top - halo_top, bottom + halo_bottom)
+	columns = np.arange(left - halo_left, right + halo_right)
+	# part of the region within the array
+	inner_top, inner_bottom = (max(rows[0], 0), min(rows[-1] + 1, height))
+	inner_left, inner_right = (max(columns[0], 0), min(columns[-1] + 1, width))
+	if (inner_top, inner_bottom, inner_left, inner_right) == (rows[0], rows[-1] + 1, columns[0], columns[-1] + 1):
+		return array[inner_top:inner_bottom, inner_left:inner_right]
+	region = np.empty((len(rows), len(columns), channels), dtype=array.dtype)
+	y0, y1 = (inner_top - rows[0], inner_bottom - rows[0])
+	x0, x1 = (inner_left - columns[0], inner_right - columns[0])
+	region[y0:y1, x0:x1] = array[inner_top:inner_bottom, inner_left:inner_right]
+	# strips past the top / bottom edge (full width), then past the left / right edge
+	strips = [(slice(0, y0), slice(None)), (slice(y1, None), slice(None)), (slice(y0, y1), slice(0, x0)), (slice(y0, y1), slice(x1, None))]
+	for strip_rows, strip_columns in strips:
+		if len(rows[strip_rows]) and len(columns[strip_columns]):
+			region[strip_rows, strip_columns] = get_boundary_pixels(array, rows[strip_rows], columns[strip_columns], padding_type, fill)
+	return region
+
+def get_pixel_buffer(image):
+	if isinstance(image, PixelBuffer):
+		return image
+	return PixelBuffer.from_image(image)
+
+# array of pixel values -> list of pixels (int for single channel, else tuple)
+def to_pixel_list(array):
+	if array.shape[-1] == 1:
+		return array[:, 0].tolist()
+	return list(map(tuple, array.tolist()))
+
+# list of pixels -> (n, channels) uint8 array
+def pixels_to_array(pixel_list, channels):
+	try:
+		values = np.asarray(pixel_list)
+		if values.dtype == object:
+			raise ValueError('mixed pixel formats')
+		if values.ndim == 1:
+			values = values[:, np.newaxis]
+		if values.shape[1] != channels:
+			raise ValueError('mixed pixel formats')
+	except ValueError:
+		values = np.array([fit_channels(p, channels) for p in pixel_list])
+	return np.clip(values, 0, 255).astype(np.uint8)
+
+# convert a pixel to the given number of channels
+def fit_channels(pixel, channels):
+	if channels == 1:
+		return get_brightness(pixel)
+	if not isinstance(pixel, (list, tuple)): # grayscale
+		pixel = (pixel,) * 3
+	pixel = tuple(pixel[:channels])
+	if len(pixel) < channels: # opaque alpha
+		pixel += (255,) * (channels - len(pixel))
+	return pixel
+
+# black pixel that fills the space left by shifted pixels (opaque if there is an alpha channel)
+def get_blank_pixel(channels):
+	if channels == 4:
+		return (0, 0, 0, 255)
+	return (0,) * channels
+
 # --- Helper Functions ---
 # get linear array of all pixels - row by row (left to right) / col by col (top to bottom)
 def get_pixel_array(image, horizontal=True):
-	width, height = image.size
-	pixel_array = []
-	dim_a = height if horizontal else width
-	dim_b = width if horizontal else height
-	for y in range(dim_a): # rows/cols
-		for x in range(dim_b): # scan horizontally/vertically
-			if horizontal:
-				pixel = image.getpixel((x,y))
-			else: # x scans vertically
-				pixel = image.getpixel((y,x))
-			pixel_array.append(pixel)
-	return pixel_array
+	return get_pixel_buffer(image).get_pixels(horizontal)
 
 # break pixel array into segments
 def segment_pixels(pixel_array, segment_size):
@@ -222,22 +429,14 @@ def get_pixel_columns(image):
 # fill the image with pixels from the list in horizontal (or vertical) fashion
 # segment_list is an array of grouped pixels (lists)
 def place_segments(image, segment_list, horizontal):
-	i = -1
-	for segment in segment_list:
-		i = place_pixels(image, segment, horizontal, index=i)
-	return i
+	return place_pixels(image, merge_groups(segment_list), horizontal)
 
+# image may be a PIL image (written back in one copy) or a PixelBuffer
 def place_pixels(image, pixel_list, horizontal, index=-1):
-	width, height = image.size
-	for pixel in pixel_list:
-		index += 1 # next pixel
-		if horizontal:
-			x = index % width
-			y = index // width
-		else: # vertical
-			y = index % height
-			x = index // height
-		image.putpixel((x,y), pixel)
+	buffer = get_pixel_buffer(image)
+	index = buffer.place_pixels(pixel_list, horizontal, index)
+	if buffer is not image:
+		buffer.write_to(image)
 	return index
 
 # number of color channels of a pixel
@@ -258,6 +457,14 @@ def get_brightness(pixel):
 	brightness = round(0.299*pixel[0] + 0.587*pixel[1] + 0.114*pixel[2])
 	return clamp_intensity(brightness)
 
+# brightness of each pixel in a (height, width, channels) array - same as get_brightness - (height, width) uint8
+def get_brightness_array(array):
+	if array.shape[2] == 1: # grayscale
+		return array[:, :, 0]
+	# luminosity method
+	brightness = np.round(0.299*array[:, :, 0] + 0.587*array[:, :, 1] + 0.114*array[:, :, 2])
+	return np.clip(brightness, 0, 255).astype(np.uint8)
+
 def get_dimension_names(dir_index): # one dimension - from start to end
 	dim_start = 'Left/Top'
 	dim_end = 'Right/Bottom'
@@ -1,6 +1,73 @@
-from PIL import Image
+import numpy as np
 import matplotlib.pyplot as plt
-from .image_helpers import (print_image_size, print_continue, choose_option, get_channels, get_total_pixels, clamp_intensity)
+from .image_helpers import (get_pixel_buffer, print_image_size, print_continue, choose_option)
+from .transformations import apply_lut
+
+# pixel counts of every intensity for each color channel - (channels, 256)
+# built with one scan of the image and shared by the histogram displays and equalization
+class Histogram():
+	def __init__(self, counts):
+		self.counts = counts
+
+	@classmethod
+	def from_image(cls, image):
+		return cls.from_array(get_pixel_buffer(image).array)
+
+	@classmethod
+	def from_array(cls, array): # (height, width, channels)
+		channels = array.shape[2]
+		counts = [np.bincount(array[:, :, c].ravel(), minlength=256) for c in range(channels)]
+		return cls(np.array(counts, dtype=np.int64))
+
+	@classmethod
+	def empty(cls, channels):
+		return cls(np.zeros((channels, 256), dtype=np.int64))
+
+	# count the pixels of another part of the image - (height, width, channels)
+	def add(self, array):
+		for c in range(self.channels):
+			self.counts[c] += np.bincount(array[:, :, c].ravel(), minlength=256)
+
+	@property
+	def channels(self):
+		return self.counts.shape[0]
+
+	@property
+	def total_pixels(self):
+		return int(self.counts[0].sum())
+
+	# key 	-> bin index (left to right)
+	# value -> total pixels in bin, for each channel
+	def get_bins(self, bins, frequency_type=0):
+		if bins < 1:
+			bins = 1
+		elif bins > 256:
+			bins = 256
+		# width of each bin
+		interval_width = 256 / bins
+		bin_index = [int(intensity / interval_width) for intensity in range(256)] # round down
+		totals = np.zeros((self.channels, bins), dtype=np.int64)
+		for c in range(self.channels):
+			totals[c] = np.bincount(bin_index, weights=self.counts[c], minlength=bins)
+		data = {}
+		for i in range(bins):
+			data[i] = [int(totals[c][i]) for c in range(self.channels)]
+		# get percents
+		if frequency_type == 1:
+			for i in range(bins):
+				for c in range(self.channels):
+					data[i][c] /= self.total_pixels
+					data[i][c] = data[i][c] * 100
+		return data
+
+	# cumulative distribution function of each channel - (channels, 256)
+	def get_cdf(self):
+		normal_counts = self.counts / self.total_pixels # normalize (divide by total pixels)
+		return np.cumsum(normal_counts, axis=1)
+
+	# table that spreads the intensities uniformly
+	def get_equalization_lut(self):
+		return np.clip(np.round(255 * self.get_cdf()), 0, 255).astype(np.uint8)
 
 # --- pixel intensity histogram ---
 def start_histogram_display_process(image):
@@ -10,10 +77,11 @@ def start_histogram_display_process(image):
 	print()
 	format = choose_histogram_frequency()
 	print()
+	histogram = Histogram.from_image(image)
 	if alg == 0:
-		print_histogram_data(image, n, format)
+		print_histogram_data(image, n, format, histogram)
 	else:
-		show_histogram(image, n, format)
+		show_histogram(image, n, format, histogram)
 	return image
 
 def get_bins():
@@ -39,44 +107,17 @@ def choose_histogram_frequency():
 	choices = ['Pixels (total)', 'Percent (of all pixels in the image)']
 	return choose_option(choices, 'Frequency Format:')
 
-def get_histogram_data(image, bins, frequency_type=0):
-	channels = get_channels(image.getpixel((0,0)))
-	# key 	-> bin index (left to right)
-	# value -> total pixels in bin
-	data = {}
-	if bins < 1:
-		bins = 1
-	elif bins > 256:
-		bins = 256
-	# width of each bin
-	interval_width = 256 / bins
-	# default bin totals
-	for i in range(bins):
-		data[i] = [0] * channels
-	# place each pixel into bin based on intensity
-	for x in range(image.width):
-		for y in range(image.height):
-			pixel = image.getpixel((x,y))
-			for c in range(channels):
-				if channels == 1: # grayscale
-					intensity = pixel
-				else:
-					intensity = pixel[c]
-				i = int(intensity / interval_width) # round down
-				data[i][c] += 1
-	# get percents
-	if frequency_type == 1:
-		total_pixels = get_total_pixels(image)
-		for i in range(bins):
-			for c in range(channels):
-				data[i][c] /= total_pixels
-				data[i][c] = data[i][c] * 100
-	return data
+def get_histogram_data(image, bins, frequency_type=0, histogram=None):
+	if histogram == None:
+		histogram = Histogram.from_image(image)
+	return histogram.get_bins(bins, frequency_type)
 
-def print_histogram_data(image, num_bins=10, frequency_type=0):
-	channels = get_channels(image.getpixel((0,0)))
+def print_histogram_data(image, num_bins=10, frequency_type=0, histogram=None):
+	if histogram == None:
+		histogram = Histogram.from_image(image)
+	channels = histogram.channels
 	interval_width = 256 / num_bins # width that each bin spans (amount of intensities covered) 
-	data = get_histogram_data(image, num_bins, frequency_type)
+	data = histogram.get_bins(num_bins, frequency_type)
 	# display data
 	if channels == 1:
 		print('interval: pixel count')
@@ -92,12 +133,14 @@ def print_histogram_data(image, num_bins=10, frequency_type=0):
 	print()
 	print_continue()
 
-def show_histogram(image, num_bins=10, frequency_type=0):
+def show_histogram(image, num_bins=10, frequency_type=0, histogram=None):
 	print('Generating Histogram of Pixel Intensities...')
 	print_image_size(image)
-	channels = get_channels(image.getpixel((0,0)))
+	if histogram == None:
+		histogram = Histogram.from_image(image)
+	channels = histogram.channels
 	# get pixel counts for each intensity
-	data = get_histogram_data(image, num_bins, frequency_type)
+	data = histogram.get_bins(num_bins, frequency_type)
 	interval_width = 256 / num_bins
 	intervals = [] # names of each interval
 	for i in data.keys():
@@ -147,50 +190,11 @@ def start_histogram_equalization_process(image):
 	image = histogram_equalization(image)
 	return image
 
-def histogram_equalization(image):
-	width, height = image.size
-	channels = get_channels(image.getpixel((0,0)))
-	equalized_image = Image.new(mode=image.mode, size=(width,height))
+def histogram_equalization(image, histogram=None):
+	buffer = get_pixel_buffer(image).copy()
 	# get histogram with 256 bins
-	histogram = [[] for _ in range(channels)] # each element is a new bin of width 1
-	for c in range(channels):
-		while len(histogram[c]) < 256:
-			histogram[c].append(0)
-	for x in range(width):
-		for y in range(height):
-			pixel = image.getpixel((x,y))
-			for c in range(channels):
-				if channels == 1:
-					intensity = pixel
-				else:
-					intensity = pixel[c]
-				histogram[c][intensity] += 1 # add to total
-	# normalize histogram (divide by total pixels)
-	total_pixels = width * height
-	for i in range(256):
-		for c in range(channels):
-			histogram[c][i] /= total_pixels
-	# cumulative distribution function
-	def cdf(nh, intensity):
-		total = 0
-		for i in range(intensity+1):
-			total += nh[i]
-		return total
-	# equalize image
-	for x in range(width):
-		for y in range(height):
-			source_pixel = image.getpixel((x,y))
-			new_pixel = [0]*channels
-			for c in range(channels):
-				if channels == 1:
-					source_channel = source_pixel
-				else:
-					source_channel = source_pixel[c]
-				new_pixel[c] = 255 * cdf(histogram[c], source_channel)
-				new_pixel[c] = clamp_intensity(round(new_pixel[c]))
-			if channels > 1:
-				new_pixel = tuple(new_pixel)
-			else:
-				new_pixel = new_pixel[0]
-			equalized_image.putpixel((x,y), new_pixel)
-	return equalized_image
\ No newline at end of file
+	if histogram == None:
+		histogram = Histogram.from_array(buffer.array)
+	# equalize image - map each intensity through the cumulative distribution
+	buffer.array = apply_lut(buffer.array, histogram.get_equalization_lut())
+	return buffer.to_image()
@@ -1,6 +1,6 @@
 from PIL import Image
-from .image_helpers import (choose_option, get_value, get_image_file)
-from .blending import (choose_blend_mode, get_blend, get_opacity)
+from .image_helpers import (choose_option, get_value, get_image_file, get_pixel_buffer)
+from .blending import (choose_blend_mode, blend_arrays, get_opacity)
 
 # --- overlays ---
 def start_overlay_process(image):
@@ -14,10 +14,11 @@ def start_overlay_process(image):
 		print(e)
 		return image
 	# ensure matching image formats
+	alpha = None
 	if overlay.mode != image.mode:
 		try:
 			print(f'converting overlay to format: {image.mode}')
-			overlay = overlay.convert(mode=image.mode)
+			overlay, alpha = convert_overlay(overlay, image.mode)
 		except Exception as e:
 			print(e)
 			return image
@@ -31,9 +32,17 @@ def start_overlay_process(image):
 	opacity = get_opacity()
 	print()
 	print('Placing Overlay...')
-	return place_overlay(image, overlay, align, align_offsets, bm, opacity)
+	return place_overlay(image, overlay, align, align_offsets, bm, opacity, alpha)
 
-def place_overlay(image, overlay, alignment, offsets, blend_mode, opacity):
+# convert the colour channels of the overlay to the image mode - keeping its transparency (None if opaque)
+def convert_overlay(overlay, mode):
+	alpha = None
+	if 'A' in overlay.getbands() or 'transparency' in overlay.info:
+		alpha = overlay.convert('RGBA').getchannel('A')
+	return overlay.convert(mode=mode), alpha
+
+# alpha - transparency of the overlay (L image), taken from the overlay itself if it is RGBA / LA
+def place_overlay(image, overlay, alignment, offsets, blend_mode, opacity, alpha=None):
 	width, height = image.size
 	overlay_width, overlay_height = overlay.size
 	# place overlay in aligned position
@@ -55,22 +64,25 @@ def place_overlay(image, overlay, alignment, offsets, blend_mode, opacity):
 	# apply offsets to alignment
 	aligned_x += int(offsets[0] * overlay_width)
 	aligned_y += int(offsets[1] * overlay_height)
-	# copy the overlay to the image
-	for x in range(overlay_width):
-		for y in range(overlay_height):
-			# overlay relative to image canvas
-			rel_x = aligned_x + x
-			rel_y = aligned_y + y
-			# check bounds
-			if rel_x < 0 or rel_x >= width:
-				continue
-			elif rel_y < 0 or rel_y >= height:
-				continue
-			source_pixel = image.getpixel((rel_x,rel_y))
-			overlay_pixel = overlay.getpixel((x,y))
-			# blend overlay on top
-			source_pixel = get_blend([source_pixel, overlay_pixel], blend_mode, opacity)
-			image.putpixel((rel_x,rel_y), source_pixel)
+	# region of the image covered by the overlay
+	left = max(aligned_x, 0)
+	top = max(aligned_y, 0)
+	right = min(aligned_x + overlay_width, width)
+	bottom = min(aligned_y + overlay_height, height)
+	if left >= right or top >= bottom: # overlay is off the canvas
+		return image
+	buffer = get_pixel_buffer(image)
+	source_pixels = buffer.array[top:bottom, left:right]
+	overlay_pixels = get_pixel_buffer(overlay).array[top-aligned_y:bottom-aligned_y, left-aligned_x:right-aligned_x]
+	# transparent overlay pixels are blended in less
+	if alpha is None and overlay.mode in ['RGBA', 'LA']:
+		alpha = overlay.getchannel('A')
+	if alpha is not None:
+		alpha_pixels = get_pixel_buffer(alpha).array[top-aligned_y:bottom-aligned_y, left-aligned_x:right-aligned_x]
+		opacity = opacity * (alpha_pixels / 255)
+	# blend overlay on top
+	source_pixels[:] = blend_arrays([source_pixels, overlay_pixels], blend_mode, opacity)
+	buffer.write_to(image)
 	return image
 
 def choose_overlay_alignment():
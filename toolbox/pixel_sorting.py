@@ -1,6 +1,6 @@
 import math
 import random
-from PIL import Image
+import numpy as np
 from .image_helpers import (Alignment,
 					print_image_size,
 					choose_option,
@@ -8,18 +8,19 @@ from .image_helpers import (Alignment,
 					choose_yes_no,
 					get_value, 
 					get_total_pixels, 
-					get_pixel_array,
-					get_pixel_rows,
-					get_pixel_columns,
-					segment_pixels,
-					place_segments,
+					get_pixel_buffer,
 					get_brightness,
+					get_brightness_array,
+					get_blank_pixel,
 					get_dimension_names,
 					divide_list,
-					merge_groups)
-from .shifts import (pixel_shift, rotate_shift, blank_shift, choose_pixel_shifter)
-from .warps import (make_wave_shift, choose_wave_shifter)
-from .blending import (BlendMode, blend_lines)
+					get_generator,
+					get_child_seed,
+					spawn_seeds,
+					spawn_generators)
+from .shifts import (rotate_shift, blank_shift, get_shift_indices, choose_shift_dir, get_shift_percent, make_pixel_shifter)
+from .warps import (make_wave_shift, choose_wave_parameters, make_wave_shifter)
+from .blending import (BlendMode, blend_arrays)
 
 # --- line sort ---
 def start_line_sort_process(image):
@@ -27,13 +28,36 @@ def start_line_sort_process(image):
 	print()
 	segment_size = get_segment_size(image, segment_type)
 	print()
+	sort_method = choose_line_sort_method()
+	print()
+	sort_asc = True # ascending order
+	shift_dir = 1
+	shift_percent = 0
+	sort_function = get_line_sort_function(sort_method)
+	if sort_function == rotate_shift or sort_function == blank_shift: # custom shift
+		dim_index = 0 if segment_type in [1,3] else 1
+		if segment_type == 2: # cross
+			dim_index = 2
+		shift_dir = choose_shift_dir(dim_index)
+		print()
+		shift_percent = get_shift_percent()
+		print()
+	elif sort_function != random_sort: # key sort functions
+		sort_asc = choose_sort_direction()
+		print()
+	print('Sorting Segments...')
+	return apply_line_sort(image, segment_type, segment_size, sort_method, sort_asc, shift_dir, shift_percent)
+
+# segment_type - rows, columns, crosshatch, horizontal pixels, vertical pixels
+# sort_method - brightness, random, rotate shift, blank shift
+# shift_dir, shift_percent - used by the shift methods (see make_pixel_shifter)
+# seed - for the random methods (see spawn_seeds)
+def apply_line_sort(image, segment_type=0, segment_size=1, sort_method=0, ascending=True, shift_dir=1, shift_percent=0.2, seed=None):
 	sort_by_pixel = False # (by lines)
 	if segment_type in [3,4]: # by pixels
 		sort_by_pixel = True
 	use_sort_key = False # is function used as a sort key
-	sort_asc = True # ascending order
-	sort_function = choose_line_sort_function()
-	print()
+	sort_function = get_line_sort_function(sort_method)
 	# create non-key functions
 	next_sort_function = None
 	if sort_function == random_sort: # direction does not matter
@@ -41,9 +65,6 @@ def start_line_sort_process(image):
 	elif sort_function == rotate_shift or sort_function == blank_shift: # create custom shift
 		rotate = True if sort_function == rotate_shift else False
 		horizontal_first = True if segment_type in [0,2] else False
-		dim_index = 0 if segment_type in [1,3] else 1
-		if segment_type == 2: # cross
-			dim_index = 2
 		if not sort_by_pixel:
 			w = image.width / segment_size
 			h = image.height / segment_size
@@ -51,21 +72,20 @@ def start_line_sort_process(image):
 			total = get_total_pixels(image)
 			w = total / segment_size
 			h = w
-		sort_function, next_sort_function = choose_pixel_shifter(w, h, rotate, dim_index, horizontal_first, use_segments=True)
+		sort_function, next_sort_function = make_pixel_shifter(w, h, rotate, shift_dir, shift_percent, horizontal_first, use_segments=True)
 	else: # key sort functions
 		use_sort_key = True
-		sort_asc = choose_sort_direction()
-		print()
-		
-	print('Sorting Segments...')
 	# now sort - order of rows/cols first was proven to make no difference in all cases
+	buffer = get_pixel_buffer(image).copy() # shared by both passes of a crosshatch
+	key_plane = None
+	row_seed, col_seed = spawn_seeds(seed, 2)
 	if segment_type in [0,2,3]: # rows
-		image = line_sort(image, sort_function, is_key=use_sort_key, horizontal=True, by_pixel=sort_by_pixel, line_width=segment_size, ascending=sort_asc)
+		key_plane = sort_segments(buffer, sort_function, is_key=use_sort_key, horizontal=True, by_pixel=sort_by_pixel, line_width=segment_size, ascending=ascending, seed=row_seed)
 	if next_sort_function: # swap the sort function
 		sort_function = next_sort_function
 	if segment_type in [1,2,4]: # cols
-		image = line_sort(image, sort_function, is_key=use_sort_key, horizontal=False, by_pixel=sort_by_pixel, line_width=segment_size, ascending=sort_asc)
-	return image
+		sort_segments(buffer, sort_function, is_key=use_sort_key, horizontal=False, by_pixel=sort_by_pixel, line_width=segment_size, ascending=ascending, key_plane=key_plane, seed=col_seed)
+	return buffer.to_image()
 
 def choose_segment_type():
 	choices = ['Rows', 'Columns', 'Crosshatch', 'Horizontal Pixels', 'Vertical Pixels']
@@ -95,9 +115,11 @@ def get_segment_size(image, segment_type):
 		max_size = get_total_pixels(image)
 		return get_value(1, max_size, 'How many pixels', integer=True)
 
-def choose_line_sort_function():
+def choose_line_sort_method():
 	choices = ['Brightness Sort', 'Random Sort', 'Rotate Shift', 'Blank Shift']
-	sort_type = choose_option(choices, 'Sort Method:')
+	return choose_option(choices, 'Sort Method:')
+
+def get_line_sort_function(sort_type):
 	if sort_type == 0:
 		return brightness_segment_sort
 	elif sort_type == 1:
@@ -114,14 +136,34 @@ def brightness_segment_sort(segment):
 		total_brightness += get_brightness(pixel)
 	return total_brightness # no need to average
 
+# plane of the per-pixel values each segment key adds up - (height, width)
+SEGMENT_KEY_PLANES = {
+	brightness_segment_sort: get_brightness_array
+}
+
 # is_key - is the sorting algorithm used as a comparison key. Or does it sort the segments directly
 # horizontal - will the line segments be horizontal / vertical
 # line_width - how thick will the line segments be (1 row, 2 rows)
 # by_pixel - sort by pixel instead of lines
-def line_sort(image, sort_function, is_key=True, horizontal=True, by_pixel=False, line_width=1, ascending=True):
-	width, height = image.size
+# seed - for the non-key functions
+def line_sort(image, sort_function, is_key=True, horizontal=True, by_pixel=False, line_width=1, ascending=True, seed=None):
+	buffer = get_pixel_buffer(image).copy()
+	sort_segments(buffer, sort_function, is_key, horizontal, by_pixel, line_width, ascending, seed=seed)
+	return buffer.to_image()
+
+# sort the segments of a buffer in place
+# key_plane - values summed for each segment key (see SEGMENT_KEY_PLANES), computed if not given
+# returns the key plane, rearranged with the pixels
+def sort_segments(buffer, sort_function, is_key=True, horizontal=True, by_pixel=False, line_width=1, ascending=True, key_plane=None, seed=None):
+	height, width, channels = buffer.array.shape
+	if is_key and key_plane is None:
+		key_plane = SEGMENT_KEY_PLANES[sort_function](buffer.array)
 	# linear array of pixels - by row (or by column)
-	pixel_array = get_pixel_array(image, horizontal)
+	pixel_array = buffer.array
+	if not horizontal:
+		pixel_array = pixel_array.transpose(1, 0, 2)
+	pixel_array = pixel_array.reshape(-1, channels)
+	total_pixels = len(pixel_array)
 	# split image into segments (rows or cols)
 	segment_size = int(line_width)
 	if not by_pixel:
@@ -129,29 +171,64 @@ def line_sort(image, sort_function, is_key=True, horizontal=True, by_pixel=False
 			segment_size *= width
 		else: # vertical
 			segment_size *= height
-	segments = segment_pixels(pixel_array, segment_size)
 	# sort segments
 	if is_key:
-		segments.sort(key=sort_function, reverse=(not ascending)) # reversed is descending
+		key_array = key_plane if horizontal else key_plane.T
+		keys = get_segment_sums(key_array.ravel(), segment_size)
+		if not ascending: # reversed is descending (equal keys keep their order)
+			keys = -keys
+		order = np.argsort(keys, kind='stable')
 	else: # arranged directly
-		sort_function(segments)
-	# place pixels in new image
-	dest_image = Image.new(mode=image.mode, size=(width,height))
-	place_segments(dest_image, segments, horizontal)
-	return dest_image
+		order = arrange_segments(sort_function, -(-total_pixels // segment_size), get_generator(seed))
+	# gather the pixels of the segments in their new order - blank segments take the blank pixel (past the end)
+	indices = get_segment_indices(order, segment_size, total_pixels)
+	pixel_array = np.concatenate([pixel_array, [get_blank_pixel(channels)]])[indices]
+	if horizontal:
+		buffer.array[:] = pixel_array.reshape(height, width, channels)
+	else:
+		buffer.array[:] = pixel_array.reshape(width, height, channels).transpose(1, 0, 2)
+	# rearrange the keys too
+	if is_key:
+		key_array = np.append(key_array.ravel(), 0)[indices]
+		if horizontal:
+			key_plane = key_array.reshape(height, width)
+		else:
+			key_plane = key_array.reshape(width, height).T
+	return key_plane
+
+# sum of each segment of a linear array - the last segment may be shorter
+def get_segment_sums(values, segment_size):
+	full_segments = len(values) // segment_size
+	sums = values[:full_segments*segment_size].reshape(full_segments, segment_size).sum(axis=1, dtype=np.int64)
+	if full_segments * segment_size < len(values):
+		sums = np.append(sums, values[full_segments*segment_size:].sum(dtype=np.int64))
+	return sums
+
+# new order of the segments after a list arranger (shuffle, shift) - blank segments are -1
+def arrange_segments(sort_function, num_segments, rng=None):
+	segments = [[i] for i in range(num_segments)]
+	sort_function(segments, rng)
+	return np.array([segment[0] if isinstance(segment[0], int) else -1 for segment in segments], dtype=np.int64)
+
+# linear index of every pixel, when the segments are placed in the given order
+# blank segments (-1) have the full segment size and point at index total_pixels
+# pixels past the end of the image are cut off
+def get_segment_indices(order, segment_size, total_pixels):
+	if len(order) == 0:
+		return np.zeros(0, dtype=np.int64)
+	last_segment = (total_pixels - 1) // segment_size
+	lengths = np.full(len(order), segment_size, dtype=np.int64)
+	lengths[order == last_segment] = total_pixels - last_segment * segment_size
+	ends = np.cumsum(lengths)
+	starts = order * segment_size
+	indices = np.repeat(starts - (ends - lengths), lengths) + np.arange(ends[-1])
+	indices[np.repeat(order < 0, lengths)] = total_pixels
+	return indices[:total_pixels]
 
 # --- glitch sort ---
 def start_glitch_sort_process(image):
 	glitch_dir = choose_glitch_direction()
 	print()
-	horizontal = True
-	if glitch_dir in [1, 3]: # vertical
-		horizontal = False
-	repetitions = 1
-	if glitch_dir in [2, 3]: # cross
-		# a complete glitch (100% frequency) in each direction gaurentees a unique state
-		# - cannot be changed further by sorting in either direction
-		repetitions = 2 # glitch once in each direction
 	glitch_freq = get_glitch_frequency()
 	print()
 	glitch_cover = get_glitch_coverage()
@@ -162,33 +239,64 @@ def start_glitch_sort_process(image):
 	if anchor != Alignment.NONE: # is aligned
 		anchor_offset = get_alignment_offset(anchor)
 		print()
-	use_sort_key = False # is function used as a sort key
-	sort_asc = True # ascending order
-	sort_function = choose_glitch_sort_function()
+	sort_method = choose_glitch_sort_method()
 	print()
+	sort_asc = True # ascending order
+	shift_dir = 1
+	shift_percent = 0
+	wave_parameters = ()
+	sort_function = get_glitch_sort_function(sort_method)
+	if sort_function == rotate_shift or sort_function == blank_shift: # custom shift
+		shift_dir = choose_shift_dir(glitch_dir)
+		print()
+		shift_percent = get_shift_percent()
+		print()
+	elif sort_function == make_wave_shift: # wave shift
+		wave_parameters = choose_wave_parameters()
+	elif sort_function != random_sort: # key sort functions
+		sort_asc = choose_sort_direction()
+		print()
+	print('Glitch Sorting...')
+	return apply_glitch_sort(image, glitch_dir, glitch_freq, glitch_cover, anchor, anchor_offset, sort_method, sort_asc, 
+						shift_dir, shift_percent, *wave_parameters)
+
+# glitch_dir - direction index (horizontal, vertical, cross 1, cross 2)
+# sort_method - brightness, random, rotate shift, blank shift, wave shift
+# shift_dir, shift_percent - used by the shift methods (see make_pixel_shifter)
+# wave_type, wave_period, wave_amplitude, wave_circular - used by the wave method (see make_wave_shifter)
+# seed - for the random choices (see spawn_seeds)
+def apply_glitch_sort(image, glitch_dir=0, frequency=0.5, coverage=1, alignment=Alignment.NONE, offset=0, sort_method=0, ascending=True, 
+						shift_dir=1, shift_percent=0.2, wave_type=0, wave_period=0.15, wave_amplitude=0.5, wave_circular=True, seed=None):
+	horizontal = True
+	if glitch_dir in [1, 3]: # vertical
+		horizontal = False
+	repetitions = 1
+	if glitch_dir in [2, 3]: # cross
+		# a complete glitch (100% frequency) in each direction gaurentees a unique state
+		# - cannot be changed further by sorting in either direction
+		repetitions = 2 # glitch once in each direction
+	use_sort_key = False # is function used as a sort key
+	sort_function = get_glitch_sort_function(sort_method)
 	# create non-key functions
 	next_sort_function = None
 	if sort_function == random_sort: # direction does not matter
 		pass
 	# create custom shift
 	elif sort_function == rotate_shift or sort_function == blank_shift:
-		w = image.width * glitch_cover
-		h = image.height * glitch_cover
+		w = image.width * coverage
+		h = image.height * coverage
 		rotate = True if sort_function == rotate_shift else False
-		sort_function, next_sort_function = choose_pixel_shifter(w, h, rotate, glitch_dir, horizontal)
+		sort_function, next_sort_function = make_pixel_shifter(w, h, rotate, shift_dir, shift_percent, horizontal)
 	# create wave shift
 	elif sort_function == make_wave_shift:
-		w = image.width * glitch_cover
-		h = image.height * glitch_cover
-		sort_function, next_sort_function = choose_wave_shifter(w, h, horizontal_first=horizontal)
+		w = image.width * coverage
+		h = image.height * coverage
+		sort_function, next_sort_function = make_wave_shifter(w, h, wave_type, wave_period, wave_amplitude, wave_circular, horizontal_first=horizontal)
 	else: # key sort functions
 		use_sort_key = True
-		sort_asc = choose_sort_direction()
-		print()
-	print('Glitch Sorting...')
-	for _ in range(repetitions):
-		image = glitch_sort(image, sort_function, is_key=use_sort_key, frequency=glitch_freq, coverage=glitch_cover, 
-									horizontal=horizontal, ascending=sort_asc, alignment=anchor, offset=anchor_offset)
+	for pass_seed in spawn_seeds(seed, repetitions):
+		image = glitch_sort(image, sort_function, is_key=use_sort_key, frequency=frequency, coverage=coverage, 
+									horizontal=horizontal, ascending=ascending, alignment=alignment, offset=offset, seed=pass_seed)
 		horizontal = not horizontal # change dir
 		if next_sort_function: # swap functions
 			sort_function, next_sort_function = next_sort_function, sort_function
@@ -216,9 +324,11 @@ def get_alignment_offset(alignment): # takes int (alignment enum)
 	else:
 		return get_value(0, 100, 'Alignment Offset (%)', default=0) / 100
 
-def choose_glitch_sort_function():
+def choose_glitch_sort_method():
 	choices = ['Brightness Sort', 'Random Sort', 'Rotate Shift', 'Blank Shift', 'Wave Shift']
-	sort_type = choose_option(choices, 'Glitch Method:')
+	return choose_option(choices, 'Glitch Method:')
+
+def get_glitch_sort_function(sort_type):
 	if sort_type == 0:
 		return brightness_sort
 	elif sort_type == 1:
@@ -234,9 +344,16 @@ def choose_glitch_sort_function():
 def brightness_sort(pixel):
 	return get_brightness(pixel)
 
+# key of every pixel in an array of pixels - (lines, pixels, channels) -> (lines, pixels)
+GLITCH_KEY_PLANES = {
+	brightness_sort: get_brightness_array
+}
+
 # list arranger algorithms (orders list in place):
-def random_sort(pixel_list):
-	random.shuffle(pixel_list)
+def random_sort(pixel_list, rng=None):
+	if rng is None:
+		rng = get_generator()
+	rng.shuffle(pixel_list)
 
 # is_key - the sorting method is used as a key to compare elements. otherwise, it sorts the line directly
 # frequency - percent of lines that are affected on average
@@ -245,22 +362,19 @@ def random_sort(pixel_list):
 # ascending - or descending sorted data
 # alignment - glitches anchored to left/top, center, right/bottom, or are randomly placed
 # offset - percent of line that the glitch is away from the aligned position
-def glitch_sort(image, sort_function, is_key=True, frequency=0.5, coverage=0.5, horizontal=True, ascending=True, alignment=Alignment.NONE, offset=0):
-	width, height = image.size
-	if horizontal:
-		image_array = get_pixel_rows(image)
-	else:
-		image_array = get_pixel_columns(image)
-	# sort the pixels within each line
-	for line in image_array:
-		if random.random() <= frequency: # glitch this line
-			# line_dim is the length of the entireline
-			if horizontal:
-				line_dim = width
-			else:
-				line_dim = height
-			# get glitch pixels
-			glitch_length = int(line_dim * coverage) # 1 extra to length
+# seed - every line makes its random choices from its own stream (see spawn_seeds)
+def glitch_sort(image, sort_function, is_key=True, frequency=0.5, coverage=0.5, horizontal=True, ascending=True, alignment=Alignment.NONE, offset=0, seed=None):
+	buffer = get_pixel_buffer(image).copy()
+	lines = buffer.get_lines(horizontal) # views into the buffer
+	# line_dim is the length of the entire line
+	line_dim = lines.shape[1]
+	glitch_length = int(line_dim * coverage) # 1 extra to length
+	# choose the glitched lines
+	glitched_lines = []
+	starts = []
+	arrangements = [] # new order (or shift) of each glitch, for the non-key functions
+	for i, rng in enumerate(spawn_generators(seed, len(lines))):
+		if rng.random() <= frequency: # glitch this line
 			# start of glitch effect (based on alignemnt)
 			if alignment == Alignment.START: # left/top
 				start = int(line_dim * offset) % line_dim
@@ -269,41 +383,48 @@ def glitch_sort(image, sort_function, is_key=True, frequency=0.5, coverage=0.5,
 			elif alignment == Alignment.CENTER: # center
 				start = int(line_dim * (0.5 + offset) - glitch_length / 2) % line_dim
 			else: # randomize
-				start = random.randint(0, line_dim-1)
-			end = start + glitch_length
-			wrap_around = 0 # glitch continues around the corner
-			if end > line_dim:
-				wrap_around = end - line_dim
-				end = line_dim
-			# get glitch pixels
-			glitch_line = line[start:end]
-			glitch_line.extend(line[0:wrap_around])
-			# sort the glitch line
-			if is_key:
-				glitch_line.sort(key=sort_function, reverse=(not ascending))
-			else:
-				sort_function(glitch_line)
-			# copy back to original line
-			line[start:end] = glitch_line[0:(end - start)]
-			line[0:wrap_around] = glitch_line[(end - start):]
+				start = int(rng.integers(0, line_dim))
+			glitched_lines.append(i)
+			starts.append(start)
+			if not is_key:
+				arrangements.append(arrange_glitch(sort_function, glitch_length, rng))
 		else: # this line was not glitched
 			if not is_key: # still call function
-				sort_function([])
+				arrange_glitch(sort_function, 0, rng)
+	if not glitched_lines or glitch_length == 0:
+		return buffer.to_image()
+	# glitch continues around the corner
+	glitched_lines = np.array(glitched_lines)[:, np.newaxis]
+	glitch_indices = (np.array(starts)[:, np.newaxis] + np.arange(glitch_length)) % line_dim
+	glitches = lines[glitched_lines, glitch_indices] # (glitches, glitch_length, channels)
+	# sort all glitches at once
+	if is_key:
+		keys = GLITCH_KEY_PLANES[sort_function](glitches).astype(np.int64)
+		if not ascending: # reversed is descending (equal keys keep their order)
+			keys = -keys
+		order = np.argsort(keys, axis=1, kind='stable')
+	elif hasattr(sort_function, 'get_shift'): # shifts
+		order = get_shift_indices(arrangements, glitch_length, sort_function.circular)
+	else:
+		order = np.array(arrangements)
+	# blank pixels (-1) are read from past the end of each glitch
+	glitches = np.concatenate([glitches, np.broadcast_to(get_blank_pixel(buffer.channels), (len(glitches), 1, buffer.channels))], axis=1)
+	# copy back to original lines
+	lines[glitched_lines, glitch_indices] = glitches[np.arange(len(glitches))[:, np.newaxis], order]
 	# build image
-	dest_image = Image.new(mode=image.mode, size=(width,height))
-	place_segments(dest_image, image_array, horizontal)
-	return dest_image
+	return buffer.to_image()
+
+# arrangement of a glitch of the given length, made by a non-key function:
+# the shift of a shifter, or the new order of the pixels for a list arranger (blank pixels are -1)
+def arrange_glitch(sort_function, glitch_length, rng=None):
+	if hasattr(sort_function, 'get_shift'):
+		return sort_function.get_shift(glitch_length, rng)
+	return arrange_segments(sort_function, glitch_length, rng)
 
 # --- ghost split ---
 def start_ghost_split_process(image):
 	direction = choose_split_direction()
 	print()
-	is_horizontal = True
-	if direction in [1, 3]: # vertical
-		is_horizontal = False
-	repetitions = 1
-	if direction in [2, 3]: # cross
-		repetitions = 2 # apply effect once in each direction
 	splits = get_num_splits()
 	print()
 	split_offset_type = choose_split_offset_type(direction)
@@ -315,9 +436,20 @@ def start_ghost_split_process(image):
 	split_type = choose_split_type()
 	print()
 	print('Ghost Splitting...')
-	for _ in range(repetitions):
-		image = ghost_split(image, num_splits=splits, horizontal=is_horizontal, offset=split_offset, 
-		      				offset_type=split_offset_type, circular_split=circular, style=split_type)
+	return apply_ghost_split(image, direction, splits, split_offset_type, split_offset, circular, split_type)
+
+# direction - direction index (horizontal, vertical, cross 1, cross 2)
+# seed - for the random offset directions (see spawn_seeds)
+def apply_ghost_split(image, direction=0, num_splits=1, offset_type=0, offset=0.5, circular=True, style=0, seed=None):
+	is_horizontal = True
+	if direction in [1, 3]: # vertical
+		is_horizontal = False
+	repetitions = 1
+	if direction in [2, 3]: # cross
+		repetitions = 2 # apply effect once in each direction
+	for pass_seed in spawn_seeds(seed, repetitions):
+		image = ghost_split(image, num_splits=num_splits, horizontal=is_horizontal, offset=offset, 
+		      				offset_type=offset_type, circular_split=circular, style=style, seed=pass_seed)
 		is_horizontal = not is_horizontal # change directions
 	return image
 
@@ -331,6 +463,13 @@ def choose_split_type():
 	choices = ['None (Lines)', 'Average', 'Lighten', 'Darken']
 	return choose_option(choices, 'Ghost Blend:')
 
+# blend mode of each ghost blend (style)
+GHOST_BLEND_MODES = {
+	1: BlendMode.AVERAGE,
+	2: BlendMode.LIGHTEN,
+	3: BlendMode.DARKEN
+}
+
 def choose_split_offset_type(split_dir):
 	dim_names = get_dimension_names(split_dir)
 	choices = [dim_names[0], dim_names[1], 'Mirrored', 'Random Sections', 'Complete-Random']
@@ -347,12 +486,11 @@ def get_split_offset():
 def choose_split_wraparound():
 	return choose_yes_no('Circular Split?', default='yes')
 
-def ghost_split(image, num_splits=1, horizontal=True, offset=0.5, offset_type=0, circular_split=True, style=0):
-	if horizontal:
-		lines = get_pixel_rows(image)
-	else: # vertical
-		lines = get_pixel_columns(image)
-	line_length = len(lines[0])
+# seed - the random section directions come from its first stream, and the random line directions from one stream per line
+def ghost_split(image, num_splits=1, horizontal=True, offset=0.5, offset_type=0, circular_split=True, style=0, seed=None):
+	buffer = get_pixel_buffer(image)
+	lines = buffer.get_lines(horizontal) # views into the buffer
+	line_length = lines.shape[1]
 	shift = line_length / num_splits * offset
 	shift_directions = []
 	if offset_type == 1: # offset towards dimension end
@@ -364,35 +502,47 @@ def ghost_split(image, num_splits=1, horizontal=True, offset=0.5, offset_type=0,
 			else:
 				shift_directions.append(-1)
 	elif offset_type == 3: # random
+		rng = get_generator(get_child_seed(seed, 0))
 		for _ in range(num_splits):
-			if random.random() < 0.5:
+			if rng.random() < 0.5:
 				shift_directions.append(1)
 			else:
 				shift_directions.append(-1)
-	# split every 2nd line apart
-	for i, next_line in enumerate(lines):
-		if i % 2 == 1: # do not split
+	# every 2nd line is split apart
+	split_lines = np.arange(0, len(lines), 2)
+	line_signs = np.ones(len(split_lines))
+	if offset_type == 4: # random offset direction each split (flips the direction of the splits after it too)
+		line_seed = get_child_seed(seed, 1)
+		flips = [get_generator(get_child_seed(line_seed, i)).random() < 0.5 for i in split_lines]
+		line_signs[np.cumsum(flips) % 2 == 1] = -1
+	# shift of each section of every split line - (split lines, sections)
+	section_shifts = shift * line_signs[:, np.newaxis] * np.ones(num_splits)
+	if shift_directions: # predefined shift for each section
+		section_shifts = abs(shift) * np.array(shift_directions) * np.ones((len(split_lines), 1))
+	section_shifts = np.ceil(section_shifts).astype(np.int64) # can only shift a whole number of pixels (round up)
+	# source of every pixel in the split lines - one map for all sections, same shifts as pixel_shift
+	indices = np.tile(np.arange(line_length), (len(split_lines), 1))
+	for k, section in enumerate(divide_list(range(line_length), num_splits)):
+		if len(section) == 0:
 			continue
-		if offset_type == 4 and random.random() < 0.5: # random offset direction each split
-			shift *= -1
-		split_sections = divide_list(next_line, num_splits)
-		for k, section in enumerate(split_sections):
-			if shift_directions: # switch to predefined shift for each section
-				x = shift_directions[k]
-				shift = abs(shift)
-				if x < 0:
-					shift *= -1
-			# shift sections
-			pixel_shift(section, shift, circular=circular_split)
-		# replace pixels
-		next_line[:] = merge_groups(split_sections)
+		section_indices = get_shift_indices(section_shifts[:, k], len(section), circular_split)
+		# blank pixels are read from past the end of the line
+		indices[:, section.start:section.stop] = np.where(section_indices < 0, line_length, section_indices + section.start)
+	blank_pixels = np.broadcast_to(get_blank_pixel(buffer.channels), (len(split_lines), 1, buffer.channels))
+	split = np.concatenate([lines[split_lines], blank_pixels], axis=1)
+	indices += np.arange(len(split_lines))[:, np.newaxis] * (line_length + 1) # into the flattened lines
+	split = split.reshape(-1, buffer.channels).take(indices, axis=0)
+	# blend to balance the split lines - each split line with the line after it (same groups as blend_lines)
+	blend_mode = GHOST_BLEND_MODES.get(style)
+	if blend_mode is None:
+		lines[split_lines] = split
+	else:
+		pairs = split_lines[split_lines + 1 < len(lines)] # an odd line out at the end is not blended
+		blend = blend_arrays([split[:len(pairs)], lines[pairs + 1]], blend_mode=blend_mode)
+		lines[pairs] = blend
+		lines[pairs + 1] = blend
+		if len(pairs) < len(split_lines):
+			lines[split_lines[-1]] = split[-1]
 	# overwrite image with new data
-	place_segments(image, lines, horizontal)
-	# blend to balance the split lines
-	if style == 1:
-		image = blend_lines(image, rows=horizontal, num_lines=2, bm=BlendMode.AVERAGE)
-	elif style == 2:
-		image = blend_lines(image, rows=horizontal, num_lines=2, bm=BlendMode.LIGHTEN)
-	elif style == 3:
-		image = blend_lines(image, rows=horizontal, num_lines=2, bm=BlendMode.DARKEN)
-	return image
\ No newline at end of file
+	buffer.write_to(image)
+	return image
@@ -0,0 +1,348 @@
+import os
+import math
+import json
+import zlib
+import numpy as np
+from PIL import Image
+from .image_helpers import (get_total_pixels, to_seed_sequence, get_child_seed, get_generator)
+from .image_basics import (crop_image, flip_image, pad_rotate, scale_image, pad_image)
+from .color import (BLACK, RED, GREEN, BLUE, apply_monochrome, hue_shift, resaturate, apply_heatmap, apply_random_colors,
+					apply_color_split, make_shape_directions, make_split_directions, make_split_colors, get_radius_pixels, hsv_to_rgb)
+from .transformations import (apply_transformation)
+from .image_histogram import (histogram_equalization)
+from .filters import (apply_convolution, non_linear_filter)
+from .pixel_sorting import (apply_line_sort, apply_glitch_sort, apply_ghost_split)
+from .warps import (apply_wave_warp, apply_mirror)
+from .blending import (BlendMode, blend_lines, pixelate)
+from .overlays import (place_overlay, convert_overlay)
+
+# --- recipes ---
+# a recipe is an ordered list of steps, stored as json - either a list, or an object with a "steps" list
+# each step names an effect (as in the menu) and the parameters its prompts would collect:
+# - options are given by their index in the prompt's list of choices
+# - percents are given as they would be typed (50 for 50%), and 0 picks a random value where the prompt allows it
+# - missing parameters use the prompt defaults
+# - any step may give a "seed" (a non-negative integer) for its random choices - otherwise it uses a stream of the recipe seed
+# ex. [{"effect": "Hue Shift", "degrees": 90}, {"effect": "Mirror", "direction": 2, "mirrors": 3}]
+
+def load_recipe(path):
+	with open(path) as recipe_file:
+		recipe = json.load(recipe_file)
+	recipe = read_recipe(recipe)
+	# overlay files are relative to the recipe
+	recipe_dir = os.path.dirname(os.path.abspath(path))
+	for step in recipe:
+		if step['effect'] == 'Overlay' and isinstance(step.get('file'), str):
+			step['file'] = os.path.join(recipe_dir, step['file'])
+	return recipe
+
+# check the steps of a parsed recipe - returns a list of step dictionaries
+def read_recipe(recipe):
+	if isinstance(recipe, dict):
+		recipe = recipe.get('steps')
+	if not isinstance(recipe, list):
+		raise ValueError('recipe must be a list of steps')
+	steps = []
+	for i, step in enumerate(recipe):
+		if not isinstance(step, dict) or 'effect' not in step:
+			raise ValueError(f'step {i+1} must be an object with an effect')
+		effect = step['effect']
+		if effect not in RECIPE_EFFECTS:
+			raise ValueError(f'step {i+1} - unknown effect: {effect}')
+		_, parameter_names = RECIPE_EFFECTS[effect]
+		for name in step:
+			if name not in ['effect', 'seed'] and name not in parameter_names:
+				raise ValueError(f'step {i+1} - unknown {effect} parameter: {name}')
+		steps.append(dict(step))
+	return steps
+
+# apply each step in order
+# seed - for the random choices of steps without their own seed (None for a fresh one)
+def apply_recipe(image, recipe, seed=None):
+	for step in seed_recipe(recipe, seed):
+		effect = step['effect']
+		recipe_function, _ = RECIPE_EFFECTS[effect]
+		image = recipe_function(image, step)
+		if not image:
+			raise ValueError(f'{effect} failed')
+	return image
+
+# give every step a seed sequence - its own seed, or the child of the recipe seed numbered by its place in the recipe
+def seed_recipe(recipe, seed=None):
+	recipe_seed = to_seed_sequence(seed)
+	seeded = []
+	for i, step in enumerate(recipe):
+		step_seed = step.get('seed')
+		if step_seed is None:
+			step_seed = get_child_seed(recipe_seed, i)
+		elif not isinstance(step_seed, np.random.SeedSequence):
+			step_seed = to_seed_sequence(check_number(step_seed, step['effect'], 'seed', 0, math.inf, integer=True))
+		seeded.append(dict(step, seed=step_seed))
+	return seeded
+
+# seed for the random choices of a step's effect
+def get_seed(step):
+	return get_child_seed(step.get('seed'), 0)
+
+# --- parameters ---
+def check_number(x, effect, name, min_val, max_val, integer=False):
+	if isinstance(x, bool) or not isinstance(x, (int, float)) or (integer and not float(x).is_integer()):
+		kind = 'an integer' if integer else 'a number'
+		raise ValueError(f'{effect} - {name} must be {kind}')
+	if x < min_val or x > max_val:
+		raise ValueError(f'{effect} - {name} must be in [{min_val}, {max_val}]')
+	if integer:
+		x = int(x)
+	return x
+
+def get_number(step, name, min_val, max_val, default=None, integer=False):
+	return check_number(step.get(name, default), step['effect'], name, min_val, max_val, integer)
+
+def get_option(step, name, num_choices, default=0):
+	return get_number(step, name, 0, num_choices - 1, default, integer=True)
+
+def get_flag(step, name, default=False):
+	x = step.get(name, default)
+	if not isinstance(x, bool):
+		raise ValueError(f'{step["effect"]} - {name} must be true or false')
+	return x
+
+def get_list(step, name, min_length, max_length, default=None):
+	x = step.get(name, default)
+	if not isinstance(x, list) or len(x) < min_length or len(x) > max_length:
+		raise ValueError(f'{step["effect"]} - {name} must be a list of {min_length}-{max_length} values')
+	return x
+
+def get_numbers(step, name, min_val, max_val, min_length, max_length, default=None, integer=False):
+	values = get_list(step, name, min_length, max_length, default)
+	return [check_number(x, step['effect'], name, min_val, max_val, integer) for x in values]
+
+# [0,1] - a percent of 0 is replaced by a random percent
+def get_percent(step, name, default, randomize=False):
+	x = get_number(step, name, 0, 100, default)
+	if x == 0 and randomize: # each parameter has its own stream of the step seed
+		x = int(get_generator(get_child_seed(step.get('seed'), zlib.crc32(name.encode()) + 1)).integers(1, 101))
+	return x / 100
+
+# one offset for all sides, (height, width) or (top, bottom, left, right)
+def get_offsets(step):
+	if isinstance(step.get('offsets'), list):
+		offsets = get_numbers(step, 'offsets', -math.inf, math.inf, 2, 4, integer=True)
+		if len(offsets) == 3:
+			raise ValueError(f'{step["effect"]} - offsets must be a list of 2 or 4 integers')
+		return offsets
+	return get_number(step, 'offsets', -math.inf, math.inf, 0, integer=True)
+
+def get_shift_direction(step):
+	return [1, -1, 0][get_option(step, 'shift_direction', 3)]
+
+def get_sort_ascending(step):
+	return get_option(step, 'sort_direction', 2) == 0
+
+# --- effects ---
+# each takes the image and a step dictionary
+def recipe_crop(image, step):
+	return crop_image(image, get_offsets(step))
+
+def recipe_flip(image, step):
+	return flip_image(image, get_flag(step, 'horizontal'), get_flag(step, 'vertical'))
+
+def recipe_rotate(image, step):
+	degrees = get_number(step, 'degrees', -360, 360, 0) % 360
+	return pad_rotate(image, degrees, get_option(step, 'padding', 3), get_option(step, 'interpolation', 2))
+
+def recipe_scale(image, step):
+	new_size = get_numbers(step, 'size', 1, math.inf, 2, 2, list(image.size), integer=True)
+	downscale = new_size[0] < image.width and new_size[1] < image.height
+	interpolation = get_option(step, 'interpolation', 3 if downscale else 2)
+	return scale_image(image, new_size, interpolation)
+
+def recipe_pad(image, step):
+	return pad_image(image, get_offsets(step), get_option(step, 'padding', 3))
+
+def recipe_hue_shift(image, step):
+	if image.mode == 'L': # nothing to shift
+		return image
+	return hue_shift(image, read_hue_shift(step))
+
+def recipe_resaturate(image, step):
+	if image.mode == 'L': # nothing to saturate
+		return image
+	scale, by_percent = read_resaturate(step)
+	return resaturate(image, scale, by_percent=by_percent)
+
+def recipe_transformation(image, step):
+	return apply_transformation(image, *read_transformation(step))
+
+def recipe_histogram_equalization(image, step):
+	return histogram_equalization(image)
+
+def recipe_monochrome(image, step):
+	return apply_monochrome(image, read_monochrome(step))
+
+def recipe_pseudo_color(image, step):
+	heatmap, num_colors = read_pseudo_color(step)
+	if heatmap:
+		return apply_heatmap(image)
+	return apply_random_colors(image, num_colors, get_seed(step))
+
+def recipe_color_split(image, step):
+	return apply_color_split(image, *read_color_split(image, step))
+
+def recipe_convolution(image, step):
+	return apply_convolution(image, *read_convolution(image, step))
+
+def recipe_non_linear_filter(image, step):
+	return non_linear_filter(image, *read_non_linear_filter(image, step))
+
+def recipe_line_sort(image, step):
+	segment_type = get_option(step, 'segment_type', 5)
+	max_sizes = [image.height, image.width, min(image.size), get_total_pixels(image), get_total_pixels(image)]
+	segment_size = get_number(step, 'segment_size', 1, max_sizes[segment_type], 1, integer=True)
+	return apply_line_sort(image, segment_type, segment_size, get_option(step, 'method', 4), get_sort_ascending(step),
+						get_shift_direction(step), get_percent(step, 'shift', 20), get_seed(step))
+
+def recipe_glitch_sort(image, step):
+	glitch_dir = get_option(step, 'direction', 4)
+	frequency = get_percent(step, 'frequency', 50)
+	coverage = get_percent(step, 'coverage', 100)
+	alignment = get_option(step, 'alignment', 4)
+	offset = 0
+	if alignment == 3: # center
+		offset = get_number(step, 'alignment_offset', -50, 50, 0) / 100
+	elif alignment != 0:
+		offset = get_number(step, 'alignment_offset', 0, 100, 0) / 100
+	return apply_glitch_sort(image, glitch_dir, frequency, coverage, alignment, offset, get_option(step, 'method', 5), get_sort_ascending(step),
+						get_shift_direction(step), get_percent(step, 'shift', 20),
+						get_option(step, 'wave_type', 4), get_percent(step, 'period', 15), get_percent(step, 'amplitude', 50, randomize=True),
+						get_option(step, 'wraparound', 2) == 0, get_seed(step))
+
+def recipe_ghost_split(image, step):
+	return apply_ghost_split(image, get_option(step, 'direction', 4), get_number(step, 'splits', 1, 10, 1, integer=True),
+						get_option(step, 'offset_direction', 5), get_percent(step, 'offset', 50, randomize=True),
+						get_flag(step, 'circular', True), get_option(step, 'blend', 4), get_seed(step))
+
+def recipe_wave_warp(image, step):
+	return apply_wave_warp(image, get_option(step, 'direction', 4), get_option(step, 'wave_type', 4), get_percent(step, 'period', 15),
+						get_percent(step, 'amplitude', 50, randomize=True), get_option(step, 'wraparound', 2) == 0,
+						get_flag(step, 'subpixel'))
+
+def recipe_mirror(image, step):
+	return apply_mirror(image, get_option(step, 'direction', 3), get_number(step, 'mirrors', 1, 10, 1, integer=True), get_option(step, 'side', 3),
+						get_seed(step))
+
+def recipe_blend_lines(image, step):
+	rows = get_option(step, 'line_type', 2) == 0
+	num_lines = get_number(step, 'lines', 2, image.height if rows else image.width, 2, integer=True)
+	return blend_lines(image, rows=rows, num_lines=num_lines, bm=get_option(step, 'blend', 13), alpha=get_percent(step, 'opacity', 100, randomize=True))
+
+def recipe_pixelate(image, step):
+	max_box = max(int(min(image.size) * 0.2), 1)
+	return pixelate(image, get_number(step, 'size', 1, max_box, 1, integer=True), get_option(step, 'blend', 13, BlendMode.AVERAGE))
+
+def recipe_overlay(image, step):
+	overlay_path = step.get('file')
+	if not isinstance(overlay_path, str):
+		raise ValueError('Overlay - file must be a path')
+	overlay = Image.open(overlay_path)
+	alpha = None
+	if overlay.mode != image.mode: # ensure matching image formats
+		overlay, alpha = convert_overlay(overlay, image.mode)
+	alignment = get_number(step, 'alignment', 1, 9, 5, integer=True)
+	offsets = [x / 100 for x in get_numbers(step, 'offset', -400, 400, 2, 2, [0,0])]
+	return place_overlay(image, overlay, alignment, offsets, get_option(step, 'blend', 13), get_percent(step, 'opacity', 100, randomize=True), alpha)
+
+# --- effect parameters ---
+# shared with streaming, which only has the size and mode of the image (not its pixels)
+def read_hue_shift(step): # degrees
+	return get_number(step, 'degrees', -360, 360, 30) % 360
+
+def read_resaturate(step): # (scale, by percent)
+	by_percent = get_option(step, 'scale_type', 2) == 1
+	if by_percent:
+		scale = get_number(step, 'saturation', 0, 400, 150) / 100
+	else:
+		scale = get_number(step, 'saturation', -100, 100, 10) / 100
+	return (scale, by_percent)
+
+def read_transformation(step): # (mapping, alpha, beta, gamma)
+	mapping = get_option(step, 'mapping', 3)
+	alpha = get_number(step, 'alpha', -5, 5, 1)
+	beta = get_number(step, 'beta', -100, 100, 0) / 100
+	gamma = get_number(step, 'gamma', 0.04, 25, 1)
+	return (mapping, alpha, beta, gamma)
+
+def read_monochrome(step): # color (black for grayscale)
+	colors = [BLACK, RED, GREEN, BLUE, None]
+	color = colors[get_option(step, 'color', 5)]
+	if color == None: # custom
+		color = hsv_to_rgb((get_number(step, 'hue', -360, 360, 0) % 360, 1, 1))
+	return color
+
+def read_pseudo_color(step): # (heatmap, number of random colors)
+	if get_option(step, 'algorithm', 2) == 0:
+		return (True, None)
+	return (False, get_number(step, 'colors', 2, 20, 4, integer=True))
+
+# (radius, split directions, colors, blend mode, opacity)
+def read_color_split(image, step):
+	if image.mode == 'L':
+		raise ValueError('Color Split - cannot split a grayscale image')
+	shape = get_option(step, 'shape', 4)
+	if shape == 3: # custom
+		split_dir = make_split_directions(get_numbers(step, 'angles', -360, 360, 1, 5, [0]))
+	else:
+		split_dir = make_shape_directions(['Y', 'T', 'X'][shape], get_number(step, 'rotation', -360, 360, 0))
+	radius = get_radius_pixels(image, get_percent(step, 'radius', 10, randomize=True))
+	num_splits = len(split_dir)
+	default_hues = [i * int(360 / num_splits) for i in range(num_splits)]
+	hues = get_numbers(step, 'hues', -360, 360, num_splits, num_splits, default_hues)
+	colors = make_split_colors([hue % 360 for hue in hues])
+	blend = get_option(step, 'blend', 13)
+	alpha = get_percent(step, 'opacity', 100, randomize=True)
+	return (radius, split_dir, colors, blend, alpha)
+
+def read_convolution(image, step): # (kernel matrix, scale)
+	kernel = get_list(step, 'kernel', 1, image.height)
+	width = len(kernel[0]) if isinstance(kernel[0], list) else 0
+	if width < 1 or width > image.width:
+		raise ValueError(f'Convolution - kernel rows must have 1-{image.width} entries')
+	kernel_matrix = []
+	for row in kernel: # every row has the same width
+		row_step = {'effect': 'Convolution', 'row': row}
+		kernel_matrix.append([float(x) for x in get_numbers(row_step, 'row', -math.inf, math.inf, width, width)])
+	return (kernel_matrix, get_number(step, 'scale', -20, 20, 1))
+
+def read_non_linear_filter(image, step): # (size, filter)
+	filter_type = get_option(step, 'filter', 3)
+	filter_size = get_numbers(step, 'size', 1, math.inf, 2, 2, [3,3], integer=True)
+	if filter_size[0] > image.width or filter_size[1] > image.height:
+		raise ValueError(f'Non-Linear Filters - size must fit within {image.width} x {image.height}')
+	return (tuple(filter_size), filter_type)
+
+# effect name -> (function, parameter names)
+RECIPE_EFFECTS = {
+	'Crop': (recipe_crop, ['offsets']),
+	'Flip': (recipe_flip, ['horizontal', 'vertical']),
+	'Rotate': (recipe_rotate, ['degrees', 'padding', 'interpolation']),
+	'Scale': (recipe_scale, ['size', 'interpolation']),
+	'Pad': (recipe_pad, ['padding', 'offsets']),
+	'Hue Shift': (recipe_hue_shift, ['degrees']),
+	'Resaturate': (recipe_resaturate, ['scale_type', 'saturation']),
+	'Transformations': (recipe_transformation, ['mapping', 'alpha', 'beta', 'gamma']),
+	'Histogram Equalization': (recipe_histogram_equalization, []),
+	'Monochrome Conversion': (recipe_monochrome, ['color', 'hue']),
+	'Pseudo Color': (recipe_pseudo_color, ['algorithm', 'colors']),
+	'Color Split': (recipe_color_split, ['shape', 'rotation', 'angles', 'radius', 'hues', 'blend', 'opacity']),
+	'Convolution': (recipe_convolution, ['kernel', 'scale']),
+	'Non-Linear Filters': (recipe_non_linear_filter, ['filter', 'size']),
+	'Line Sort': (recipe_line_sort, ['segment_type', 'segment_size', 'method', 'sort_direction', 'shift_direction', 'shift']),
+	'Glitch Sort': (recipe_glitch_sort, ['direction', 'frequency', 'coverage', 'alignment', 'alignment_offset', 'method', 'sort_direction',
+										'shift_direction', 'shift', 'wave_type', 'period', 'amplitude', 'wraparound']),
+	'Ghost Split': (recipe_ghost_split, ['direction', 'splits', 'offset_direction', 'offset', 'circular', 'blend']),
+	'Wave Warp': (recipe_wave_warp, ['direction', 'wave_type', 'period', 'amplitude', 'wraparound', 'subpixel']),
+	'Mirror': (recipe_mirror, ['direction', 'mirrors', 'side']),
+	'Blend Lines': (recipe_blend_lines, ['line_type', 'lines', 'blend', 'opacity']),
+	'Pixelate': (recipe_pixelate, ['size', 'blend']),
+	'Overlay': (recipe_overlay, ['file', 'alignment', 'offset', 'blend', 'opacity'])
+}
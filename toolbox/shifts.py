@@ -1,23 +1,27 @@
 import math
-import random
-from .image_helpers import (choose_option, get_value, get_dimension_names)
+import numpy as np
+from .image_helpers import (choose_option, get_value, get_dimension_names, get_blank_pixel, get_generator)
 from .color import BLACK
 
 # positive shift -> shifts left
-def pixel_shift(pixel_list, shift, circular=True, randomize_shift=False, randomize_dir=False, segments=False):
-	if not pixel_list:
+# rng - generator for the random shift / direction (a fresh one if not given)
+def pixel_shift(pixel_list, shift, circular=True, randomize_shift=False, randomize_dir=False, segments=False, rng=None):
+	if len(pixel_list) == 0:
 		return
-	if randomize_shift: # choose random shift value
-		shift = random.randint(0, len(pixel_list) - 1)
-	else:
-		shift = math.ceil(shift) # can only shift a whole number of pixels (round up)
-		if circular:
-			shift %= len(pixel_list) # in range of list indices (loops around)
-	# randomize direction of shift
-	if randomize_dir and random.random() < 0.5:
-		shift *= -1
+	shift = get_pixel_shift(len(pixel_list), shift, circular, randomize_shift, randomize_dir, rng)
+	# shift an array of pixels (or segments) in place - such as a line view of a PixelBuffer
+	if isinstance(pixel_list, np.ndarray):
+		line_length = len(pixel_list)
+		shifted_pixels = np.roll(pixel_list, -shift, axis=0)
+		if not circular: # blank the void area
+			blank_unit = get_blank_pixel(pixel_list.shape[-1])
+			if shift >= 0:
+				shifted_pixels[max(line_length - shift, 0):] = blank_unit
+			else: # negative
+				shifted_pixels[:min(-shift, line_length)] = blank_unit
+		pixel_list[:] = shifted_pixels
 	# rotate shift
-	if circular:
+	elif circular:
 		pixel_list[:] = pixel_list[shift:] + pixel_list[:shift]
 	else: # blank shift (cuts off)
 		line_length = len(pixel_list)
@@ -31,11 +35,76 @@ def pixel_shift(pixel_list, shift, circular=True, randomize_shift=False, randomi
 		else: # negative
 			pixel_list[:] = empty_strip + pixel_list[:shift]
 
-def rotate_shift(pixel_list, shift, rand_shift=False, rand_dir=False):
-	return pixel_shift(pixel_list, shift, circular=True, randomize_shift=rand_shift, randomize_dir=rand_dir)
+# whole number of pixels that a line of the given length is shifted by (positive -> left)
+def get_pixel_shift(line_length, shift, circular=True, randomize_shift=False, randomize_dir=False, rng=None):
+	if rng is None and (randomize_shift or randomize_dir):
+		rng = get_generator()
+	if randomize_shift: # choose random shift value
+		shift = int(rng.integers(0, line_length))
+	else:
+		shift = math.ceil(shift) # can only shift a whole number of pixels (round up)
+		if circular:
+			shift %= line_length # in range of list indices (loops around)
+	# randomize direction of shift
+	if randomize_dir and rng.random() < 0.5:
+		shift *= -1
+	return shift
+
+# source index of every pixel in lines of the given length, after each line is shifted - (lines, line_length)
+# same placement as pixel_shift - blank pixels are -1
+def get_shift_indices(shifts, line_length, circular=True):
+	indices = np.arange(line_length) + np.asarray(shifts, dtype=np.int64)[:, np.newaxis]
+	if circular:
+		return indices % line_length
+	indices[(indices < 0) | (indices >= line_length)] = -1
+	return indices
+
+# shift every line of a (lines, line_length, channels) array by its whole pixel shift - same as pixel_shift on each line
+def shift_lines(lines, shifts, circular=True):
+	num_lines, line_length, channels = lines.shape
+	indices = get_shift_indices(shifts, line_length, circular)
+	blank = indices < 0
+	# gather in the memory order of the lines - the columns of an image are stored across its rows
+	transposed = num_lines > 1 and lines.strides[0] < lines.strides[1]
+	if transposed:
+		lines = lines.transpose(1, 0, 2)
+		indices = (indices * num_lines + np.arange(num_lines)[:, np.newaxis]).T
+		blank = blank.T
+	else:
+		indices += np.arange(num_lines)[:, np.newaxis] * line_length
+	indices[blank] = 0
+	# gather whole pixels (as single items) from a flat copy of the lines
+	pixels = np.ascontiguousarray(lines).view(np.dtype((np.void, channels * lines.itemsize))).reshape(-1)
+	shifted_lines = pixels.take(indices).view(lines.dtype).reshape(lines.shape)
+	shifted_lines[blank] = get_blank_pixel(channels)
+	if transposed:
+		return shifted_lines.transpose(1, 0, 2)
+	return shifted_lines
+
+# shift every line by a fractional shift - each pixel blends the two pixels nearest its source position
+def shift_lines_linear(lines, shifts, circular=True):
+	num_lines, line_length, channels = lines.shape
+	positions = np.arange(line_length) + np.asarray(shifts)[:, np.newaxis]
+	left = np.floor(positions)
+	weights = (positions - left)[:, :, np.newaxis]
+	left = left.astype(np.int64)
+	blank_pixels = np.broadcast_to(get_blank_pixel(channels), (num_lines, 1, channels))
+	padded_lines = np.concatenate([lines, blank_pixels], axis=1)
+	rows = np.arange(num_lines)[:, np.newaxis]
+	def read_pixels(indices):
+		if circular:
+			indices = indices % line_length
+		else: # outside the line is blank
+			indices = np.where((indices < 0) | (indices >= line_length), line_length, indices)
+		return padded_lines[rows, indices]
+	blend = read_pixels(left) * (1 - weights) + read_pixels(left + 1) * weights
+	return np.clip(np.round(blend), 0, 255).astype(np.uint8)
 
-def blank_shift(pixel_list, shift, rand_shift=False, rand_dir=False, shift_segments=False):
-	return pixel_shift(pixel_list, shift, circular=False, randomize_shift=rand_shift, randomize_dir=rand_dir, segments=shift_segments)
+def rotate_shift(pixel_list, shift, rand_shift=False, rand_dir=False, rng=None):
+	return pixel_shift(pixel_list, shift, circular=True, randomize_shift=rand_shift, randomize_dir=rand_dir, rng=rng)
+
+def blank_shift(pixel_list, shift, rand_shift=False, rand_dir=False, shift_segments=False, rng=None):
+	return pixel_shift(pixel_list, shift, circular=False, randomize_shift=rand_shift, randomize_dir=rand_dir, segments=shift_segments, rng=rng)
 
 def choose_shift_dir(dir_index=2):
 	dim_names = get_dimension_names(dir_index)
@@ -57,6 +126,11 @@ def choose_pixel_shifter(width, height, rotate, direction_index, horizontal_firs
 	print()
 	p_shift = get_shift_percent()
 	print()
+	return make_pixel_shifter(width, height, rotate, shift_dir, p_shift, horizontal_first, use_segments)
+
+# shift_dir - 1 towards start, -1 towards end, 0 random
+# p_shift - percent of the width/height to shift by, 0 for random shifts
+def make_pixel_shifter(width, height, rotate, shift_dir=1, p_shift=0.2, horizontal_first=True, use_segments=False):
 	horizontal_shift = width * p_shift * shift_dir
 	vertical_shift = height * p_shift * shift_dir
 	# use random dir / shift
@@ -69,10 +143,25 @@ def choose_pixel_shifter(width, height, rotate, direction_index, horizontal_firs
 	# assign new shift function
 	shift = horizontal_shift if horizontal_first else vertical_shift
 	next_shift = vertical_shift if horizontal_first else horizontal_shift
-	if rotate:
-		shifter_1 = lambda pxlist: rotate_shift(pxlist, shift, random_shift, random_dir)
-		shifter_2 = lambda pxlist: rotate_shift(pxlist, next_shift, random_shift, random_dir)
-	else:
-		shifter_1 = lambda pxlist: blank_shift(pxlist, shift, random_shift, random_dir, shift_segments=use_segments)
-		shifter_2 = lambda pxlist: blank_shift(pxlist, next_shift, random_shift, random_dir, shift_segments=use_segments)
+	shifter_1 = PixelShifter(shift, rotate, random_shift, random_dir, segments=use_segments)
+	shifter_2 = PixelShifter(next_shift, rotate, random_shift, random_dir, segments=use_segments)
 	return (shifter_1, shifter_2)
+
+# shifts every line (or list of segments) it is called on with pixel_shift
+# get_shift makes the same choices for a line without moving its pixels - for shifting many lines at once
+class PixelShifter():
+	def __init__(self, shift, circular=True, randomize_shift=False, randomize_dir=False, segments=False):
+		self.shift = shift
+		self.circular = circular
+		self.randomize_shift = randomize_shift
+		self.randomize_dir = randomize_dir
+		self.segments = segments
+
+	def __call__(self, pixel_list, rng=None):
+		return pixel_shift(pixel_list, self.shift, self.circular, self.randomize_shift, self.randomize_dir, self.segments, rng)
+
+	# shift of the next line - empty lines are not shifted
+	def get_shift(self, line_length, rng=None):
+		if line_length == 0:
+			return 0
+		return get_pixel_shift(line_length, self.shift, self.circular, self.randomize_shift, self.randomize_dir, rng)
@@ -0,0 +1,426 @@
+import os
+import struct
+import tempfile
+import numpy as np
+from PIL import Image
+from .image_helpers import (PixelBuffer, PaddingType, format_image, boundary_indices, gather_pixels)
+from .color import (BLACK, hue_shift_array, resaturate_array, grayscale_array, monochrome_array, heatmap_array, random_colors_array,
+					get_random_colors, color_split_array, get_split_halo)
+from .transformations import (get_transformation_lut, apply_lut)
+from .image_histogram import (Histogram)
+from .filters import (convolve_array, non_linear_filter_array, get_kernel_halo)
+from .recipes import (read_hue_shift, read_resaturate, read_transformation, read_monochrome, read_pseudo_color, read_color_split,
+					read_convolution, read_non_linear_filter, seed_recipe, get_seed)
+
+# --- streaming ---
+# apply a recipe to an image in horizontal bands - only a band of rows (and the rows around it that the effects reach) is in memory at once
+# point effects (transformations, color) and neighbourhood effects (convolution, filters) can be streamed
+# effects that need statistics of the whole image (histogram equalization) first stream the image once to collect them
+
+MEMORY_LIMIT = 256 * 2**20 # bytes
+WORKING_BYTES = 48 # bytes held for each value of a row while an effect runs (float copies of the band)
+
+MODE_CHANNELS = {'L': 1, 'RGB': 3, 'RGBA': 4}
+CHANNEL_MODES = {1: 'L', 3: 'RGB', 4: 'RGBA'}
+PNM_EXTENSIONS = ['.ppm', '.pgm', '.pnm']
+TIFF_EXTENSIONS = ['.tif', '.tiff']
+BMP_EXTENSIONS = ['.bmp']
+TIFF_STRIP_BYTES = 2**16 # size of each strip written to tiff files
+
+# (mode, raw mode) -> (bytes per pixel, channel order) of uncompressed pixel data that can be read in place
+RAW_LAYOUTS = {
+	('L', 'L'): (1, [0]),
+	('RGB', 'RGB'): (3, [0,1,2]),
+	('RGB', 'BGR'): (3, [2,1,0]),
+	('RGB', 'BGRX'): (4, [2,1,0]),
+	('RGBA', 'RGBA'): (4, [0,1,2,3])
+}
+
+def stream_image(input_path, output_path, recipe, memory_limit=None, seed=None):
+	reader = BandReader(input_path)
+	writer = None
+	try:
+		pipeline = build_pipeline(reader, seed_recipe(recipe, seed), memory_limit)
+		writer = BandWriter(output_path, reader.width, reader.height, pipeline.channels, pipeline.memory_limit)
+		for top, bottom in pipeline.get_bands():
+			writer.write(pipeline.get_rows(top, bottom))
+	except Exception:
+		if writer:
+			writer.abort()
+		raise
+	finally:
+		reader.close() # before the output can replace the input
+	writer.close()
+
+# streamed steps of a recipe
+def build_pipeline(reader, recipe, memory_limit=None):
+	pipeline = StreamPipeline(reader, memory_limit)
+	for step in recipe:
+		effect = step['effect']
+		if effect not in STREAM_EFFECTS:
+			raise ValueError(f'{effect} cannot be streamed')
+		stream_step = STREAM_EFFECTS[effect](pipeline, step)
+		if stream_step:
+			pipeline.steps.append(stream_step)
+	return pipeline
+
+# size and mode of the image at the end of a pipeline - stands in for the image when reading step parameters
+class StreamInfo():
+	def __init__(self, width, height, channels):
+		self.width = width
+		self.height = height
+		self.mode = CHANNEL_MODES[channels]
+
+	@property
+	def size(self):
+		return (self.width, self.height)
+
+# --- reading / writing ---
+# reads bands of rows from an image file
+# uncompressed files (ppm/pgm, tiff, bmp) are read a band at a time, so only the rows read are loaded - other formats are decoded in full
+class BandReader():
+	def __init__(self, path):
+		image = Image.open(path)
+		self.width, self.height = image.size
+		self.array = None
+		self.file = None
+		self.strips = get_raw_strips(path, image)
+		if self.strips:
+			self.channels = MODE_CHANNELS[image.mode]
+			self.file = open(path, 'rb')
+		else:
+			image = format_image(image)
+			if not image:
+				raise ValueError('cannot read image format')
+			self.array = PixelBuffer.from_image(image).array
+			self.channels = self.array.shape[2]
+		image.close()
+
+	# rows [top, bottom) - (rows, width, channels)
+	def read_rows(self, top, bottom):
+		if self.array is not None:
+			return self.array[top:bottom]
+		rows = np.empty((bottom - top, self.width, self.channels), dtype=np.uint8)
+		for strip_top, strip_bottom, offset, stride, y_step, pixel_bytes, order in self.strips:
+			first = max(top, strip_top)
+			last = min(bottom, strip_bottom)
+			if first >= last:
+				continue
+			stored_first, stored_last = (first - strip_top, last - strip_top)
+			if y_step < 0: # stored bottom-up
+				stored_first, stored_last = (strip_bottom - last, strip_bottom - first)
+			# read the stored rows in one piece
+			self.file.seek(offset + stored_first * stride)
+			data = np.frombuffer(self.file.read((stored_last - stored_first) * stride), dtype=np.uint8).reshape(-1, stride)
+			if y_step < 0:
+				data = data[::-1]
+			pixels = data[:, :self.width * pixel_bytes].reshape(last - first, self.width, pixel_bytes)
+			rows[first - top:last - top] = pixels[:, :, order]
+		return rows
+
+	def close(self):
+		if self.file:
+			self.file.close()
+			self.file = None
+		self.strips = None
+		self.array = None
+
+# (top, bottom, offset, stride, y step, bytes per pixel, channel order) of each strip of pixel data - None if the file is not uncompressed
+def get_raw_strips(path, image):
+	if image.mode not in MODE_CHANNELS or not image.tile:
+		return None
+	width, height = image.size
+	file_size = os.path.getsize(path)
+	strips = []
+	for tile in image.tile:
+		codec, extents, offset, args = tile
+		left, top, right, bottom = extents
+		if codec != 'raw' or left != 0 or right != width:
+			return None
+		if isinstance(args, str):
+			args = (args,)
+		raw_mode = args[0]
+		stride = args[1] if len(args) > 1 else 0
+		y_step = args[2] if len(args) > 2 else 1
+		if (image.mode, raw_mode) not in RAW_LAYOUTS:
+			return None
+		pixel_bytes, order = RAW_LAYOUTS[(image.mode, raw_mode)]
+		stride = stride or width * pixel_bytes
+		if offset + (bottom - top) * stride > file_size: # truncated file
+			return None
+		strips.append((top, bottom, offset, stride, y_step, pixel_bytes, order))
+	if sum(strip[1] - strip[0] for strip in strips) != height:
+		return None
+	return strips
+
+# writes bands of rows to an image file
+# uncompressed files (ppm/pgm, tiff, bmp) are written as the bands arrive - other formats are encoded once every band is in
+class BandWriter():
+	def __init__(self, path, width, height, channels, memory_limit=None):
+		self.path = path
+		self.width = width
+		self.height = height
+		self.array = None
+		self.file = None
+		directory, filename = os.path.split(path)
+		_, extension = os.path.splitext(filename)
+		self.layout = get_raw_layout(extension.lower(), width, height, channels)
+		if self.layout:
+			# write beside the output, then replace it - the input may be the output
+			handle, self.temp_path = tempfile.mkstemp(suffix=extension, dir=directory or '.')
+			self.file = os.fdopen(handle, 'wb')
+			self.file.write(self.layout.header)
+		else:
+			image_bytes = width * height * channels
+			if image_bytes > (memory_limit or MEMORY_LIMIT):
+				print(f'warning: {extension or filename} files are encoded whole - {path} needs {image_bytes / 2**20:.1f} MB, over the memory limit')
+			self.array = np.empty((height, width, channels), dtype=np.uint8)
+		self.next_row = 0
+
+	def write(self, rows):
+		if self.file:
+			layout = self.layout
+			stored_rows = np.zeros((len(rows), layout.stride), dtype=np.uint8)
+			stored_rows[:, :self.width * len(layout.order)] = rows[:, :, layout.order].reshape(len(rows), -1)
+			if layout.bottom_up: # the band goes just above the rows already written
+				self.file.seek(layout.data_offset + (self.height - self.next_row - len(rows)) * layout.stride)
+				stored_rows = stored_rows[::-1]
+			self.file.write(stored_rows.tobytes())
+		else:
+			self.array[self.next_row:self.next_row + len(rows)] = rows
+		self.next_row += len(rows)
+
+	def close(self):
+		if self.file:
+			self.file.seek(0, os.SEEK_END)
+			self.file.write(self.layout.trailer)
+			self.file.close()
+			os.replace(self.temp_path, self.path)
+		else:
+			PixelBuffer(self.array, CHANNEL_MODES[self.array.shape[2]]).to_image().save(self.path)
+
+	def abort(self):
+		if self.file:
+			self.file.close()
+			os.remove(self.temp_path)
+
+# how the pixel rows of an uncompressed file are stored
+# header - bytes before the pixel data (at data_offset), trailer - bytes after it
+# stride - bytes of each stored row, order - stored channel order
+class RawLayout():
+	def __init__(self, header, stride, order, bottom_up=False, trailer=b''):
+		self.header = header
+		self.data_offset = len(header)
+		self.stride = stride
+		self.order = order
+		self.bottom_up = bottom_up
+		self.trailer = trailer
+
+# layout of an output file that can be written a band at a time - None if the format is encoded whole
+def get_raw_layout(extension, width, height, channels):
+	if extension in PNM_EXTENSIONS and channels in [1,3]:
+		magic_number = 'P5' if channels == 1 else 'P6'
+		return RawLayout(f'{magic_number}\n{width} {height}\n255\n'.encode('ascii'), width * channels, list(range(channels)))
+	elif extension in TIFF_EXTENSIONS:
+		return get_tiff_layout(width, height, channels)
+	elif extension in BMP_EXTENSIONS:
+		return get_bmp_layout(width, height, channels)
+	return None
+
+# little-endian tiff - header, pixel data in strips, then the image directory
+def get_tiff_layout(width, height, channels):
+	row_bytes = width * channels
+	rows_per_strip = max(TIFF_STRIP_BYTES // row_bytes, 1)
+	data_offset = 8
+	directory_offset = data_offset + row_bytes * height
+	padding = directory_offset % 2 # directory starts on a word boundary
+	directory_offset += padding
+	strip_tops = range(0, height, rows_per_strip)
+	strip_offsets = [data_offset + top * row_bytes for top in strip_tops]
+	strip_byte_counts = [(min(top + rows_per_strip, height) - top) * row_bytes for top in strip_tops]
+	photometric = 1 if channels == 1 else 2 # black is zero / rgb
+	entries = [(256, 'I', [width]), (257, 'I', [height]), (258, 'H', [8] * channels), (259, 'H', [1]), (262, 'H', [photometric]),
+			(273, 'I', strip_offsets), (277, 'H', [channels]), (278, 'I', [rows_per_strip]), (279, 'I', strip_byte_counts), (284, 'H', [1])]
+	if channels == 4:
+		entries.append((338, 'H', [2])) # extra samples - unassociated alpha
+	# values too long for their entry follow the directory
+	values_offset = directory_offset + 2 + 12 * len(entries) + 4
+	directory = struct.pack('<H', len(entries))
+	values = b''
+	for tag, value_format, tag_values in entries:
+		data = struct.pack(f'<{len(tag_values)}{value_format}', *tag_values)
+		if len(data) <= 4:
+			field = data.ljust(4, b'\0')
+		else:
+			field = struct.pack('<I', values_offset + len(values))
+			values += data
+		value_type = 3 if value_format == 'H' else 4 # short / long
+		directory += struct.pack('<HHI', tag, value_type, len(tag_values)) + field
+	header = b'II*\0' + struct.pack('<I', directory_offset)
+	trailer = b'\0' * padding + directory + struct.pack('<I', 0) + values
+	if values_offset + len(values) > 2**32 - 1: # past the 32-bit offsets
+		return None
+	return RawLayout(header, row_bytes, list(range(channels)), trailer=trailer)
+
+# bmp as PIL saves it - bottom-up rows padded to 4 bytes, grayscale palette for L
+def get_bmp_layout(width, height, channels):
+	bits = channels * 8
+	stride = ((width * bits + 7) // 8 + 3) & ~3
+	colors = 256 if channels == 1 else 0
+	palette = b''.join(bytes([i, i, i, 0]) for i in range(colors))
+	data_offset = 14 + 40 + colors * 4
+	file_size = data_offset + stride * height
+	if file_size > 2**32 - 1:
+		return None
+	ppm = int(96 * 39.3701 + 0.5) # pixels per meter at 96 dpi
+	header = b'BM' + struct.pack('<IIIIiiHHIIiiII', file_size, 0, data_offset, 40, width, height, 1, bits, 0, stride * height,
+								ppm, ppm, colors, colors) + palette
+	order = [0] if channels == 1 else [2,1,0,3][:channels] # bgr(a)
+	return RawLayout(header, stride, order, bottom_up=True)
+
+# --- pipeline ---
+# one streamed effect - array_function maps the rows of a band (plus the rows it reaches) to new rows
+# halo - (top, bottom, left, right) distance from an output pixel to the furthest pixel it reads
+# padding_type - how the pixels past the image edge are filled in (like pad_image)
+#                None passes the rows within the image, and array_function must handle the edges itself (like map_tiles)
+class StreamStep():
+	def __init__(self, array_function, channels, halo=(0,0,0,0), padding_type=None):
+		self.array_function = array_function
+		self.channels = channels
+		self.halo = halo
+		self.padding_type = padding_type
+
+	# rows [top, bottom) of the output - get_source(top, bottom) gives rows of the input
+	def get_rows(self, get_source, top, bottom, width, height):
+		halo_top, halo_bottom, halo_left, halo_right = self.halo
+		if self.padding_type == None:
+			source_top = max(top - halo_top, 0)
+			source = get_source(source_top, min(bottom + halo_bottom, height))
+			return self.array_function(source)[top - source_top:bottom - source_top]
+		# pad the band on every side - read the input rows that the padded rows come from
+		rows = boundary_indices(np.arange(top - halo_top, bottom + halo_bottom), height, self.padding_type)
+		source_rows = rows[rows >= 0]
+		first_row = source_rows.min()
+		source = get_source(first_row, source_rows.max() + 1)
+		columns = boundary_indices(np.arange(-halo_left, width + halo_right), width, self.padding_type)
+		output = self.array_function(gather_pixels(source, np.where(rows >= 0, rows - first_row, -1), columns))
+		return output[halo_top:halo_top + bottom - top, halo_left:halo_left + width]
+
+	@property
+	def padded_width(self): # extra columns read
+		if self.padding_type == None:
+			return 0
+		return self.halo[2] + self.halo[3]
+
+def point_step(array_function, channels):
+	return StreamStep(array_function, channels)
+
+# reads the image and streams it through each step
+class StreamPipeline():
+	def __init__(self, reader, memory_limit=None):
+		self.reader = reader
+		self.memory_limit = memory_limit or MEMORY_LIMIT
+		self.steps = []
+
+	@property
+	def channels(self):
+		if self.steps:
+			return self.steps[-1].channels
+		return self.reader.channels
+
+	@property
+	def info(self):
+		return StreamInfo(self.reader.width, self.reader.height, self.channels)
+
+	# rows [top, bottom) after the first steps (all of them by default)
+	def get_rows(self, top, bottom, num_steps=None):
+		if num_steps == None:
+			num_steps = len(self.steps)
+		if num_steps == 0:
+			return self.reader.read_rows(top, bottom)
+		get_source = lambda source_top, source_bottom: self.get_rows(source_top, source_bottom, num_steps - 1)
+		return self.steps[num_steps - 1].get_rows(get_source, top, bottom, self.reader.width, self.reader.height)
+
+	# tallest band whose rows (and the rows the steps reach around it) fit in the memory limit
+	def get_band_height(self):
+		halo_rows = sum(step.halo[0] + step.halo[1] for step in self.steps)
+		padded_width = self.reader.width + max([step.padded_width for step in self.steps], default=0)
+		channels = max([self.reader.channels] + [step.channels for step in self.steps])
+		row_bytes = padded_width * channels * WORKING_BYTES
+		return max(self.memory_limit // row_bytes - halo_rows, 1)
+
+	# (top, bottom) of each band
+	def get_bands(self):
+		band_height = self.get_band_height()
+		height = self.reader.height
+		return [(top, min(top + band_height, height)) for top in range(0, height, band_height)]
+
+# --- effects ---
+# each takes the pipeline so far and a step dictionary - returns the streamed step (None if it has no effect)
+def stream_hue_shift(pipeline, step):
+	if pipeline.channels == 1: # nothing to shift
+		return None
+	degrees = read_hue_shift(step)
+	return point_step(lambda array: hue_shift_array(array, degrees), pipeline.channels)
+
+def stream_resaturate(pipeline, step):
+	if pipeline.channels == 1: # nothing to saturate
+		return None
+	scale, by_percent = read_resaturate(step)
+	return point_step(lambda array: resaturate_array(array, scale, by_percent), pipeline.channels)
+
+def stream_transformation(pipeline, step):
+	lut = get_transformation_lut(*read_transformation(step), pipeline.channels)
+	return point_step(lambda array: apply_lut(array, lut), pipeline.channels)
+
+# statistics pass - count the intensities of the image so far, then stream it through the equalization table
+def stream_histogram_equalization(pipeline, step):
+	histogram = Histogram.empty(pipeline.channels)
+	for top, bottom in pipeline.get_bands():
+		histogram.add(pipeline.get_rows(top, bottom))
+	lut = histogram.get_equalization_lut()
+	return point_step(lambda array: apply_lut(array, lut), pipeline.channels)
+
+def stream_monochrome(pipeline, step):
+	color = read_monochrome(step)
+	if color == BLACK: # grayscale
+		return point_step(grayscale_array, 1)
+	return point_step(lambda array: monochrome_array(array, color), max(pipeline.channels, 3))
+
+def stream_pseudo_color(pipeline, step):
+	heatmap, num_colors = read_pseudo_color(step)
+	if heatmap:
+		return point_step(heatmap_array, 3)
+	color_list = get_random_colors(num_colors, get_seed(step)) # same colors for every band
+	return point_step(lambda array: random_colors_array(array, color_list), 3)
+
+# same as apply_color_split - reflected edges
+def stream_color_split(pipeline, step):
+	radius, split_directions, colors, blend_type, blend_alpha = read_color_split(pipeline.info, step)
+	split_band = lambda array: color_split_array(array, radius, split_directions, colors, blend_type, blend_alpha)
+	return StreamStep(split_band, pipeline.channels, get_split_halo(radius, split_directions), PaddingType.REFLECTED)
+
+# same as apply_convolution - reflected edges
+def stream_convolution(pipeline, step):
+	kernel_matrix, kernel_scale = read_convolution(pipeline.info, step)
+	kernel_size = (len(kernel_matrix[0]), len(kernel_matrix))
+	convolve_band = lambda array: convolve_array(array, kernel_matrix, kernel_scale)
+	return StreamStep(convolve_band, pipeline.channels, get_kernel_halo(kernel_size), PaddingType.REFLECTED)
+
+def stream_non_linear_filter(pipeline, step):
+	filter_size, filter_type = read_non_linear_filter(pipeline.info, step)
+	filter_band = lambda array: non_linear_filter_array(array, filter_size, filter_type)
+	return StreamStep(filter_band, pipeline.channels, get_kernel_halo(filter_size))
+
+# effect name -> function
+STREAM_EFFECTS = {
+	'Hue Shift': stream_hue_shift,
+	'Resaturate': stream_resaturate,
+	'Transformations': stream_transformation,
+	'Histogram Equalization': stream_histogram_equalization,
+	'Monochrome Conversion': stream_monochrome,
+	'Pseudo Color': stream_pseudo_color,
+	'Color Split': stream_color_split,
+	'Convolution': stream_convolution,
+	'Non-Linear Filters': stream_non_linear_filter
+}
@@ -0,0 +1,70 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .image_helpers import (get_padded_region)
+
+# --- tiling ---
+# split the output of an effect into tiles that are computed in parallel threads (numpy releases the GIL)
+# a tile reads its own region of the source plus the halo around it that the effect reaches into
+# the tiles only depend on the image size and halo - never on the number of workers - so every run gives the same result
+# effects whose pixels depend on the tile geometry (like fft sums) must run as one tile - tile_size (None, None)
+
+TILE_SIZE = (None, 128) # (width, height) - None spans the image (stripes of rows by default)
+TILE_WORKERS = None # threads per effect - None uses every core
+
+def set_tile_workers(workers):
+	global TILE_WORKERS
+	TILE_WORKERS = workers
+
+# (top, bottom, left, right) bounds of each tile
+def get_tiles(width, height, tile_size=None):
+	tile_width, tile_height = tile_size or TILE_SIZE
+	tile_width = tile_width or width
+	tile_height = tile_height or height
+	tiles = []
+	for top in range(0, height, tile_height):
+		for left in range(0, width, tile_width):
+			tiles.append((top, min(top + tile_height, height), left, min(left + tile_width, width)))
+	return tiles
+
+# tile_function(top, bottom, left, right) returns the output within those bounds
+def run_tiles(output_shape, tile_function, dtype=np.uint8, tile_size=None, workers=None):
+	height, width = output_shape[:2]
+	output = np.empty(output_shape, dtype=dtype)
+	tiles = get_tiles(width, height, tile_size)
+	def fill_tile(bounds):
+		top, bottom, left, right = bounds
+		output[top:bottom, left:right] = tile_function(top, bottom, left, right)
+	workers = workers or TILE_WORKERS or os.cpu_count() or 1
+	if workers == 1 or len(tiles) == 1:
+		for bounds in tiles:
+			fill_tile(bounds)
+	else:
+		with ThreadPoolExecutor(max_workers=workers) as pool:
+			list(pool.map(fill_tile, tiles)) # raises the first error
+	return output
+
+# tile an effect that keeps the array size
+# halo - (top, bottom, left, right) distance from an output pixel to the furthest source pixel it reads
+# padding_type - how pixels past the image edge are read (PaddingType) - every tile then has its full halo
+#                None clips tiles at the image edge, and array_function must treat pixels beyond its input the same
+#                at every position (zeros, ignored, ...) so tiles clipped at the edge see the same neighbourhood as the whole image
+def map_tiles(array, array_function, halo, padding_type=None, tile_size=None, workers=None):
+	height, width = array.shape[:2]
+	halo_top, halo_bottom, halo_left, halo_right = halo
+	# tiles at least twice as large as their halo - smaller tiles would mostly recompute the halo
+	tile_width, tile_height = tile_size or TILE_SIZE
+	if tile_width:
+		tile_width = max(tile_width, 2 * (halo_left + halo_right))
+	if tile_height:
+		tile_height = max(tile_height, 2 * (halo_top + halo_bottom))
+	def process_tile(top, bottom, left, right):
+		if padding_type != None: # only the halo past the image edge is copied
+			result = array_function(get_padded_region(array, (top, bottom, left, right), halo, padding_type))
+			return result[halo_top:halo_top + bottom - top, halo_left:halo_left + right - left]
+		source_top = max(top - halo_top, 0)
+		source_left = max(left - halo_left, 0)
+		source = array[source_top:min(bottom + halo_bottom, height), source_left:min(right + halo_right, width)]
+		result = array_function(source)
+		return result[top - source_top:bottom - source_top, left - source_left:right - source_left]
+	return run_tiles(array.shape, process_tile, array.dtype, (tile_width, tile_height), workers)
@@ -1,6 +1,5 @@
-from PIL import Image
-from .image_helpers import (choose_option, get_value, get_channels, clamp_intensity)
-from .color import BLACK
+import numpy as np
+from .image_helpers import (PixelBuffer, choose_option, get_value, get_channels, clamp_intensity)
 
 # --- transformations ---
 def start_transformation_process(image):
@@ -76,23 +75,44 @@ def power_law_transformation(pixel, gamma=1.5, c=1):
 	return tuple(new_pixel)
 
 def apply_transformation(image, transformation=0, alpha=1, beta=0, gamma=1):
-	width, height = image.size
-	transformed_image = Image.new(image.mode, size=(width,height))
-	color_black = BLACK
-	if image.mode == 'L':
-		color_black = 0
-	# fill in scaled image
-	for i in range(width):
-		for k in range(height):
-			source_pixel = image.getpixel((i,k))
-			# get pixel data
-			transformed_pixel = color_black
-			if transformation == 0: # linear
-				transformed_pixel = linear_transformation(source_pixel, alpha, beta)
-			elif transformation == 1: # negative linear
-				transformed_pixel = negative_transformation(source_pixel)
-			elif transformation == 2: # power-law
-				transformed_pixel = power_law_transformation(source_pixel, gamma)
-			# place pixel
-			transformed_image.putpixel((i,k), transformed_pixel)
-	return transformed_image
\ No newline at end of file
+	return apply_transformations(image, [(transformation, alpha, beta, gamma)])
+
+# apply consecutive transformations in a single pass - each is (transformation, alpha, beta, gamma)
+def apply_transformations(image, transformations):
+	buffer = PixelBuffer.from_image(image)
+	lut = make_lut(lambda i: i, buffer.channels) # identity
+	for transformation, alpha, beta, gamma in transformations:
+		lut = compose_luts(lut, get_transformation_lut(transformation, alpha, beta, gamma, buffer.channels))
+	buffer.array = apply_lut(buffer.array, lut)
+	return buffer.to_image()
+
+# --- lookup tables ---
+# a point operation maps each 8-bit intensity on its own - so its results for all 256 intensities
+# can be stored in a (channels, 256) table, and applied to an image with a single lookup per value
+def make_lut(point_function, channels=1):
+	point_functions = point_function
+	if callable(point_function): # same function for every channel
+		point_functions = [point_function] * channels
+	return np.array([[f(i) for i in range(256)] for f in point_functions], dtype=np.uint8)
+
+def get_transformation_lut(transformation=0, alpha=1, beta=0, gamma=1, channels=1):
+	if transformation == 0: # linear
+		point_function = lambda i: linear_transformation(i, alpha, beta)
+	elif transformation == 1: # negative linear
+		point_function = negative_transformation
+	elif transformation == 2: # power-law
+		point_function = lambda i: power_law_transformation(i, gamma)
+	else:
+		point_function = lambda i: 0
+	return make_lut(point_function, channels)
+
+# one table that applies the first table, then the second
+def compose_luts(first, second):
+	return np.take_along_axis(second, first.astype(np.intp), axis=1)
+
+# look up every value of a (height, width, channels) array in its channel's table
+def apply_lut(array, lut):
+	output = np.empty(array.shape, dtype=np.uint8)
+	for c in range(array.shape[2]):
+		output[:, :, c] = lut[c][array[:, :, c]]
+	return output
@@ -1,57 +1,84 @@
 import math
 import random
-from .image_helpers import (choose_option, choose_direction, get_value, get_pixel_rows, get_pixel_columns, divide_list, merge_groups,
-			    			place_segments, get_dimension_names)
-from .shifts import (rotate_shift, blank_shift)
+import numpy as np
+from .image_helpers import (choose_option, choose_direction, choose_yes_no, get_value, get_pixel_buffer, divide_list, get_dimension_names,
+							spawn_seeds, spawn_generators)
+from .shifts import (rotate_shift, blank_shift, get_pixel_shift, shift_lines, shift_lines_linear)
 
 # --- wave warp ---
 def start_wave_warp_process(image):
-	width, height = image.size
 	wave_dir = choose_wave_direction()
 	print()
+	wave_type, p_period, p_amplitude, circular = choose_wave_parameters()
+	subpixel = choose_subpixel_shifts()
+	print()
+	print('Creating Waves...')
+	return apply_wave_warp(image, wave_dir, wave_type, p_period, p_amplitude, circular, subpixel)
+
+# wave_dir - direction index (horizontal, vertical, cross 1, cross 2)
+# subpixel - shift by the exact height of the wave, blending neighbouring pixels (instead of whole pixels)
+def apply_wave_warp(image, wave_dir=0, wave_type=0, p_period=0.15, p_amplitude=0.5, circular=True, subpixel=False):
+	width, height = image.size
 	horizontal = True
 	if wave_dir in [1,3]: # vertical
 		horizontal = False
 	repetitions = 1
 	if wave_dir in [2,3]:
 		repetitions = 2
-	wave_shift_1, wave_shift_2 = choose_wave_shifter(width, height, not horizontal) # shift opposite direction of wave
-	print('Creating Waves...')
-	# apply wave shift to all lines
+	# shift opposite direction of wave
+	wave_shift_1, wave_shift_2 = make_wave_shifter(width, height, wave_type, p_period, p_amplitude, circular, not horizontal)
+	# apply wave shift to all lines - both directions in one buffer
+	buffer = get_pixel_buffer(image)
 	for _ in range(repetitions):
-		image = wave_warp(image, wave_shift_1, horizontal)
+		wave_warp(buffer, wave_shift_1, horizontal, subpixel)
 		# switch wave directions
 		horizontal = not horizontal
 		wave_shift_1, wave_shift_2 = wave_shift_2, wave_shift_1
+	if buffer is not image:
+		buffer.write_to(image)
 	return image
 
-def wave_warp(image, wave_shifter, horizontal):
-	if horizontal:
-		lines = get_pixel_columns(image)
+# image may be a PIL image (written back in one copy) or a PixelBuffer
+def wave_warp(image, wave_shifter, horizontal, subpixel=False):
+	buffer = get_pixel_buffer(image)
+	lines = buffer.get_lines(not horizontal) # horizontal waves shifts columns...
+	num_lines, line_length = lines.shape[:2]
+	# shift all lines at once
+	if subpixel:
+		lines[:] = shift_lines_linear(lines, wave_shifter.next_wave_heights(num_lines), wave_shifter.circular)
 	else:
-		lines = get_pixel_rows(image)
-	# shift all lines
-	for next_line in lines:
-		wave_shifter(next_line)
-	place_segments(image, lines, not horizontal) # horizontal waves shifts columns...
+		lines[:] = shift_lines(lines, wave_shifter.get_shifts(line_length, num_lines), wave_shifter.circular)
+	if buffer is not image:
+		buffer.write_to(image)
 	return image
 
+def choose_subpixel_shifts():
+	return choose_yes_no('Sub-Pixel Shifts (smooth)?', default='no')
+
 def choose_wave_shifter(width, height, horizontal_first=True): # wave_shifter_1 will shift horizontally
+	return make_wave_shifter(width, height, *choose_wave_parameters(), horizontal_first)
+
+# returns (wave type, period, amplitude, circular) - period and amplitude are percents [0,1]
+def choose_wave_parameters():
 	type_of_wave = choose_wave_type()
 	print()
 	p_period = get_wave_period() # [0,1]
 	print()
+	p_amplitude = get_wave_amplitude() # [0,1]
+	print()
+	is_circular = choose_wave_wraparound()
+	print()
+	return (type_of_wave, p_period, p_amplitude, is_circular)
+
+# p_period - percent of the image size, 0 for a random period
+def make_wave_shifter(width, height, type_of_wave=0, p_period=0.15, p_amplitude=0.5, is_circular=True, horizontal_first=True):
 	rand_period = False
 	horizontal_period = (height * p_period) * math.pi / 2
 	vertical_period = (width * p_period) * math.pi / 2
 	if p_period == 0:
 		rand_period = True
-	p_amplitude = get_wave_amplitude() # [0,1]
-	print()
 	horizontal_amp = width * p_amplitude
 	vertical_amp = height * p_amplitude
-	is_circular = choose_wave_wraparound()
-	print()
 	# build wave shift functions for each direction - horizontal waves -> vertical wave shifts
 	amplitude = horizontal_amp if horizontal_first else vertical_amp
 	period = horizontal_period if horizontal_first else vertical_period
@@ -69,7 +96,7 @@ class WaveType():
 
 def sin_function(x, amplitude, angular_frequency):
 	k = angular_frequency
-	return amplitude * math.sin(k*x)
+	return amplitude * np.sin(k*x)
 
 def triangle_function(x, amplitude, period):
 	a = amplitude
@@ -83,37 +110,72 @@ def square_function(x, amplitude, period):
 def sawtooth_function(x, amplitude, period):
 	a = amplitude
 	p = period
+	if a == 0: # flat wave
+		return np.zeros_like(x)
 	return ((2*a*x / p) - a) % (2*a) - a
 	
 def make_wave_shift(amplitude, period, wave_type=WaveType.SIN, circular=False, randomize_period=False):
-	wave_x = 0 # current x-value of the wave function - start from origin
-	def wave_shift(pixel_list):
-		nonlocal wave_x # want to modify outside variable
-		nonlocal period
-		if randomize_period:
-			period = 2 * math.pi
-		# get shift based on height of the wave function
-		frequency = (2 * math.pi) / period # k value
-		if wave_type == WaveType.SIN:
-			shift = sin_function(wave_x, amplitude, frequency)
-		elif wave_type == WaveType.TRIANGLE:
-			shift = triangle_function(wave_x, amplitude, period)
-		elif wave_type == WaveType.SQUARE:
-			shift = square_function(wave_x, amplitude, period)
-		elif wave_type == WaveType.SAWTOOTH:
-			shift = sawtooth_function(wave_x, amplitude, period)
-		else:
-			shift = 0
-			print('Unknown Wave Type...\n')
+	return WaveShifter(amplitude, period, wave_type, circular, randomize_period)
+
+# shifts each line it is called on by the height of a wave, one quarter period further along the wave each line
+# get_shift / get_shifts make the same moves for lines without shifting their pixels - for shifting many lines at once
+class WaveShifter():
+	def __init__(self, amplitude, period, wave_type=WaveType.SIN, circular=False, randomize_period=False):
+		self.amplitude = amplitude
+		self.period = period
+		self.wave_type = wave_type
+		self.circular = circular
+		self.randomize_period = randomize_period
+		self.wave_x = 0 # current x-value of the wave function - start from origin
+
+	# rng is unused - the wave has no random choices (the random period is a fixed 2pi)
+	def __call__(self, pixel_list, rng=None):
+		shift = self.next_wave_height()
 		# apply the shift
-		if circular:
+		if self.circular:
 			rotate_shift(pixel_list, shift)
 		else:
 			blank_shift(pixel_list, shift)
-		# move to next wave x position - moves in quarter ps at an angular frequency of 1
-		wave_x += (math.pi / 2)
-	# a unique wave shift function
-	return wave_shift
+
+	# shift of the next line - empty lines still move along the wave
+	def get_shift(self, line_length, rng=None):
+		shift = self.next_wave_height()
+		if line_length == 0:
+			return 0
+		return get_pixel_shift(line_length, shift, self.circular)
+
+	# whole pixel shifts of the next lines - same as get_shift for each line
+	def get_shifts(self, line_length, num_lines):
+		shifts = np.ceil(self.next_wave_heights(num_lines)).astype(np.int64) # can only shift a whole number of pixels (round up)
+		if line_length == 0:
+			return np.zeros(num_lines, dtype=np.int64)
+		if self.circular:
+			shifts %= line_length
+		return shifts
+
+	def next_wave_height(self):
+		return self.next_wave_heights(1)[0]
+
+	# heights of the wave at the next x-values, then move past them
+	def next_wave_heights(self, count):
+		if self.randomize_period:
+			self.period = 2 * math.pi
+		# x-values - moves in quarter ps at an angular frequency of 1 (accumulated one step at a time)
+		x = np.add.accumulate(np.append(self.wave_x, np.full(count, math.pi / 2)))
+		self.wave_x = float(x[-1])
+		x = x[:-1]
+		# get shifts based on height of the wave function
+		frequency = (2 * math.pi) / self.period # k value
+		if self.wave_type == WaveType.SIN:
+			return sin_function(x, self.amplitude, frequency)
+		elif self.wave_type == WaveType.TRIANGLE:
+			return triangle_function(x, self.amplitude, self.period)
+		elif self.wave_type == WaveType.SQUARE:
+			return square_function(x, self.amplitude, self.period)
+		elif self.wave_type == WaveType.SAWTOOTH:
+			return sawtooth_function(x, self.amplitude, self.period)
+		print('Unknown Wave Type...\n')
+		return np.zeros(count)
 
 def get_wave_period():
 	# P - period (in pixels)
@@ -151,19 +213,24 @@ def choose_wave_direction():
 def start_mirror_process(image):
 	mirror_dir = choose_mirror_direction()
 	print()
+	num_mirrors = get_num_mirrors()
+	print()
+	reflected_side = choose_reflected_side(mirror_dir)
+	print()
+	print('Reflecting...')
+	return apply_mirror(image, mirror_dir, num_mirrors, reflected_side)
+
+# mirror_dir - 0=horizontal, 1=vertical, 2=cross
+# seed - for the random sides (see spawn_seeds)
+def apply_mirror(image, mirror_dir=0, num_mirrors=1, reflected_side=0, seed=None):
 	horizontal = True
 	if mirror_dir in [1,3]: # vertical
 		horizontal = False
 	repetitions = 1
 	if mirror_dir in [2,3]:
 		repetitions = 2
-	num_mirrors = get_num_mirrors()
-	print()
-	reflected_side = choose_reflected_side(mirror_dir)
-	print()
-	print('Reflecting...')
-	for _ in range(repetitions):
-		image = mirror(image, num_mirrors, reflect_horizontal=horizontal, reflect_index=reflected_side)
+	for pass_seed in spawn_seeds(seed, repetitions):
+		image = mirror(image, num_mirrors, reflect_horizontal=horizontal, reflect_index=reflected_side, seed=pass_seed)
 		horizontal = not horizontal # change directions
 	return image
 
@@ -181,28 +248,27 @@ def get_num_mirrors():
 	return get_value(1, 10, 'Number of Mirrors', integer=True)
 
 # reflect_index - 0=left/top, 1=right/bottom, 2=random
-def mirror(image, num, reflect_horizontal=True, reflect_index=0):
-	if reflect_horizontal:
-		lines = get_pixel_columns(image)
-	else:
-		lines = get_pixel_rows(image)
+def mirror(image, num, reflect_horizontal=True, reflect_index=0, seed=None):
+	buffer = get_pixel_buffer(image)
+	lines = buffer.get_lines(not reflect_horizontal) # views into the buffer
 	# group into sections
 	groups = divide_list(lines, num)
-	# reflect
-	for next_group in groups:
-		half_size = len(next_group) // 2 # half number of lines (rounded down)
+	# reflect - each section picks its random side from its own stream
+	for next_group, rng in zip(groups, spawn_generators(seed, len(groups))):
+		group_size = len(next_group)
+		half_size = group_size // 2 # half number of lines (rounded down)
 		keep_left = True
 		if reflect_index == 1: # keep right
 			keep_left = False
-		elif reflect_index == 2 and random.random() < 0.5: # random
+		elif reflect_index == 2 and rng.random() < 0.5: # random
 			keep_left = False
+		if half_size == 0: # nothing to reflect
+			continue
 		# keep left/top side
 		if keep_left:
-			next_group[:] = next_group[:-half_size] + list(reversed(next_group[:half_size]))
+			next_group[group_size - half_size:] = next_group[:half_size][::-1].copy()
 		# keep right/bottom side
 		else:
-			next_group[:] = list(reversed(next_group[-half_size:])) + next_group[half_size:]
-	# merge groups - back to lines
-	lines = merge_groups(groups)
-	place_segments(image, lines, horizontal=(not reflect_horizontal))
+			next_group[:half_size] = next_group[group_size - half_size:][::-1].copy()
+	buffer.write_to(image)
 	return image
\ No newline at end of file